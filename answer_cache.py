@@ -0,0 +1,105 @@
+"""
+Semantic answer cache for single-turn SafeBot questions.
+
+The sample prompts and the questions teams ask most often used to go to
+Gemini every time. Here a new question whose embedding is at least
+SIMILARITY_THRESHOLD (cosine) from a cached question gets the cached answer.
+
+Each entry is tied to the collection fingerprint it was answered against, so
+any change to the incident collection invalidates it. Entries also expire
+after TTL_SECONDS, and the cache keeps at most MAX_ENTRIES (least recently
+used evicted first). The cache is per process, shared by all sessions.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# ─── Configuration ───
+SIMILARITY_THRESHOLD = 0.95
+TTL_SECONDS = 6 * 60 * 60
+MAX_ENTRIES = 256
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # id -> entry dict, least recently used first
+_matrix = None  # stacked unit embeddings of _entries, rebuilt lazily
+_next_id = 0
+_stats = {"hits": 0, "misses": 0, "latency_saved": 0.0}
+
+
+def _unit(embedding) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _drop(entry_ids) -> None:
+    global _matrix
+    for entry_id in entry_ids:
+        _entries.pop(entry_id, None)
+    if entry_ids:
+        _matrix = None
+
+
+def lookup(embedding, fingerprint):
+    """
+    Cached answer for a question similar to this one, or None.
+
+    Returns:
+        The entry dict ('answer', 'stats', 'latency', 'similarity') on a hit.
+    """
+    global _matrix
+    query = _unit(embedding)
+    now = time.time()
+    with _lock:
+        _drop([
+            entry_id for entry_id, entry in _entries.items()
+            if entry["fingerprint"] != fingerprint or now - entry["created"] > TTL_SECONDS
+        ])
+        if _entries:
+            if _matrix is None:
+                _matrix = np.stack([e["embedding"] for e in _entries.values()])
+            scores = _matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] >= SIMILARITY_THRESHOLD:
+                entry_id = list(_entries)[best]
+                _entries.move_to_end(entry_id)
+                _matrix = None  # order changed
+                entry = _entries[entry_id]
+                _stats["hits"] += 1
+                _stats["latency_saved"] += entry["latency"]
+                return {**entry, "similarity": float(scores[best])}
+        _stats["misses"] += 1
+        return None
+
+
+def store(embedding, fingerprint, answer, latency, stats=None) -> None:
+    """Cache an answer that took latency seconds to produce."""
+    global _next_id, _matrix
+    with _lock:
+        _entries[_next_id] = {
+            "embedding": _unit(embedding),
+            "fingerprint": fingerprint,
+            "answer": answer,
+            "latency": latency,
+            "stats": dict(stats or {}),
+            "created": time.time(),
+        }
+        _next_id += 1
+        _drop(list(_entries)[:max(0, len(_entries) - MAX_ENTRIES)])
+        _matrix = None
+
+
+def stats() -> dict:
+    """Hits, misses, hit rate, total latency saved (seconds) and current size."""
+    with _lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "latency_saved": _stats["latency_saved"],
+            "entries": len(_entries),
+        }
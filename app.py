@@ -1,6 +1,5 @@
 import streamlit as st
 import base64
-import pandas as pd
 from pathlib import Path
 
 # ─── Page Config ───
@@ -21,20 +20,13 @@ def get_logo_base64():
 logo_b64 = get_logo_base64() or ""
 
 # ─── Data for sidebar metrics ───
-DATA_DIR = Path(__file__).parent
-REPORTS_PATH = DATA_DIR / "base_reports.xlsx"
-ACTIONS_PATH = DATA_DIR / "actions.xlsx"
-
-total_incidents = 0
-total_actions = 0
-total_locations = 0
-if REPORTS_PATH.exists():
-    base = pd.read_excel(REPORTS_PATH)
-    total_incidents = len(base)
-    total_locations = base["location"].nunique() if "location" in base.columns else 0
-if ACTIONS_PATH.exists():
-    actions = pd.read_excel(ACTIONS_PATH)
-    total_actions = len(actions)
+# Read from the store manifest — no workbook parsing on navigation
+from incident_store import read_manifest
+
+manifest = read_manifest()
+total_incidents = manifest["incidents"]
+total_actions = manifest["actions"]
+total_locations = len(manifest["locations"])
 
 # ─── Global CSS ───
 st.markdown(f"""
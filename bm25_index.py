@@ -0,0 +1,120 @@
+"""
+Local BM25 keyword index over incident narratives.
+
+Vector search alone ranks exact terms — equipment tags, chemicals, procedure
+acronyms like "LOTO" or "H2S" — poorly. This keeps an in-memory inverted index
+over the TEXT_COLS fields of every incident in the store, so a query only
+scores the incidents that share at least one term with it.
+
+The index follows the store incrementally: on each search it checks the
+store's data_version(), and if that moved it indexes new incidents,
+re-indexes any whose text changed and drops any that were deleted. Unchanged
+incidents are never re-tokenized.
+"""
+
+import hashlib
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+from incident_store import TEXT_COLS, data_version, load_reports
+
+# ─── Configuration ───
+K1 = 1.5
+B = 0.75
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be been but by did do does for from had has have how i if in
+into is it its of on or so than that the their them then there these they this
+to was were what when where which who why will with would you your me my we our
+any all about most more
+""".split())
+
+_lock = threading.Lock()
+_docs = {}  # case_id -> (text hash, {term: tf}, length)
+_postings = defaultdict(dict)  # term -> {case_id: tf}
+_state = {"version": None, "total_length": 0}
+
+
+def tokenize(text: str):
+    return [t for t in TOKEN_RE.findall(str(text).lower()) if t not in STOPWORDS]
+
+
+def _remove(case_id) -> None:
+    _, freqs, length = _docs.pop(case_id)
+    for term in freqs:
+        postings = _postings[term]
+        postings.pop(case_id, None)
+        if not postings:
+            del _postings[term]
+    _state["total_length"] -= length
+
+
+def _add(case_id, digest, text) -> None:
+    tokens = tokenize(text)
+    freqs = Counter(tokens)
+    for term, tf in freqs.items():
+        _postings[term][case_id] = tf
+    _docs[case_id] = (digest, freqs, len(tokens))
+    _state["total_length"] += len(tokens)
+
+
+def _sync() -> None:
+    """Bring the index in line with the store. Call with _lock held."""
+    version = data_version()
+    if version == _state["version"]:
+        return
+    reports = load_reports()
+    seen = set()
+    if reports is not None:
+        cols = [c for c in TEXT_COLS if c in reports.columns]
+        texts = reports[cols].fillna("").astype(str).agg(" ".join, axis=1)
+        for case_id, text in zip(reports["case_id"].astype(str), texts):
+            seen.add(case_id)
+            digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+            current = _docs.get(case_id)
+            if current is not None and current[0] == digest:
+                continue
+            if current is not None:
+                _remove(case_id)
+            _add(case_id, digest, text)
+    for case_id in [c for c in _docs if c not in seen]:
+        _remove(case_id)
+    _state["version"] = version
+
+
+def search(query: str, top_k: int = 30, allowed=None):
+    """
+    BM25-ranked incidents for a free-text query.
+
+    Args:
+        query: Free-text query.
+        top_k: Maximum number of results.
+        allowed: Optional set of case_ids to restrict the search to.
+
+    Returns:
+        List of (case_id, score), best first. Empty if no term matches.
+    """
+    terms = set(tokenize(query))
+    with _lock:
+        _sync()
+        n_docs = len(_docs)
+        if not n_docs or not terms:
+            return []
+        avg_length = _state["total_length"] / n_docs
+        scores = defaultdict(float)
+        for term in terms:
+            postings = _postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for case_id, tf in postings.items():
+                if allowed is not None and case_id not in allowed:
+                    continue
+                length = _docs[case_id][2]
+                scores[case_id] += idf * tf * (K1 + 1) / (
+                    tf + K1 * (1 - B + B * length / avg_length)
+                )
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return ranked[:top_k]
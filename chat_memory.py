@@ -0,0 +1,111 @@
+"""
+Token-budgeted conversation history for SafeBot.
+
+Sending the whole chat back every turn makes long investigative sessions
+steadily slower and more expensive. compact_history() keeps the most recent
+messages verbatim and folds older ones into a rolling summary, so the history
+part of the prompt stays under HISTORY_TOKEN_BUDGET however long the session
+runs. The summary lives in the caller's conversation dict and is only
+extended (one short Gemini call) when messages fall out of the verbatim
+window, never rebuilt from scratch.
+"""
+
+import logging
+
+from clients import get_genai_client
+
+logger = logging.getLogger(__name__)
+
+# ─── Configuration ───
+HISTORY_TOKEN_BUDGET = 3_000  # summary + verbatim messages
+KEEP_RECENT = 6  # messages (3 exchanges) always kept verbatim if they fit
+SUMMARY_TOKEN_BUDGET = 500
+SUMMARY_MODEL = "gemini-2.0-flash"
+CHARS_PER_TOKEN = 4  # rough estimate for English prose
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a safety analyst
+and an AI assistant about historical safety incidents.
+
+Update the summary with the new messages below. Keep the questions asked, the
+key findings, incidents or locations discussed and any conclusions, so later
+follow-up questions can still refer to them. Write at most {words} words of
+plain prose, no headings.
+
+=== CURRENT SUMMARY ===
+{summary}
+
+=== NEW MESSAGES ===
+{messages}
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count; the one estimate behind every SafeBot prompt budget."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def history_tokens(messages) -> int:
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
+
+def _format(messages) -> str:
+    return "\n\n".join(
+        f"{'User' if m['role'] == 'user' else 'Assistant'}: {m['content']}" for m in messages
+    )
+
+
+def summarize(summary: str, messages) -> str:
+    """Fold messages into summary. Falls back to plain truncation if Gemini fails."""
+    prompt = SUMMARY_PROMPT.format(
+        words=SUMMARY_TOKEN_BUDGET * 3 // 4,
+        summary=summary or "(none yet)",
+        messages=_format(messages),
+    )
+    try:
+        response = get_genai_client().models.generate_content(model=SUMMARY_MODEL, contents=prompt)
+        text = (response.text or "").strip()
+    except Exception:
+        logger.exception("History summary failed; truncating instead")
+        text = ""
+    if not text:
+        text = f"{summary}\n\n{_format(messages)}".strip()
+    # Keep the most recent part if the model (or the fallback) ran long
+    return text[-SUMMARY_TOKEN_BUDGET * CHARS_PER_TOKEN:]
+
+
+def compact_history(chat_history, memory, token_budget=HISTORY_TOKEN_BUDGET,
+                    keep_recent=KEEP_RECENT):
+    """
+    Split chat_history into a rolling summary and the verbatim recent messages.
+
+    Args:
+        chat_history: List of dicts with 'role' and 'content', oldest first.
+        memory: Dict kept for the life of the conversation; holds the summary
+            and how many messages it covers.
+        token_budget: Estimated tokens allowed for summary + verbatim messages.
+        keep_recent: Messages kept verbatim when they fit the budget.
+
+    Returns:
+        (summary, recent_messages). The verbatim window always starts on a
+        user message; summary is "" until something has been folded into it.
+    """
+    done = memory.get("summarized", 0)
+    if done > len(chat_history):  # a new conversation reusing the dict
+        memory.pop("summary", None)
+        done = 0
+    summary = memory.get("summary", "")
+
+    split = max(done, len(chat_history) - keep_recent)
+    summary_cost = SUMMARY_TOKEN_BUDGET if split > done or summary else 0
+    while split < len(chat_history) and (
+        summary_cost + history_tokens(chat_history[split:]) > token_budget
+        or chat_history[split]["role"] != "user"
+    ):
+        split += 1
+        summary_cost = SUMMARY_TOKEN_BUDGET
+
+    if split > done:
+        summary = summarize(summary, chat_history[done:split])
+        memory["summary"] = summary
+        memory["summarized"] = split
+    return summary, chat_history[split:]
@@ -0,0 +1,164 @@
+"""
+Lazily constructed SDK clients.
+
+Importing vertexai, chromadb, google-genai or BigQuery and building their
+clients costs seconds on a cold Cloud Run container, and every page used to
+pay for it at import time whether it needed them or not. Each client here is a
+lazy singleton: the SDK is imported and the client built on first use, once
+per process (per argument set), then shared by every session and thread.
+Credentials are refreshed in place when their token expires.
+"""
+
+import functools
+import inspect
+import os
+import threading
+from pathlib import Path
+
+import streamlit as st
+
+# ─── Configuration ───
+PROJECT_ID = "methanex-safety"
+LOCATION = "us-central1"
+EMBEDDING_MODEL = "text-embedding-004"
+CHROMA_PATH = "./chroma_db"
+COLLECTION_NAME = "safety_incidents"
+SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+# Severity model (BigQuery ML) lives in its own project; locally it is reached
+# with a service-account key file
+PREDICTOR_PROJECT_ID = "pure-loop-487819-j9"
+KEY_FILE = str(Path(__file__).parent / "credentials.json")
+
+_factories = {}  # name -> factory
+_instances = {}  # (name, args) -> client
+_lock = threading.RLock()  # re-entrant: factories call other getters
+_refresh_lock = threading.Lock()
+
+
+def lazy_singleton(factory):
+    """
+    Register factory and return a getter that builds its result on first call
+    and returns the same object afterwards. Arguments are part of the key, so
+    get_x("a") and get_x("b") are separate singletons.
+    """
+    _factories[factory.__name__] = factory
+    signature = inspect.signature(factory)
+
+    @functools.wraps(factory)
+    def getter(*args, **kwargs):
+        # Fill in defaults so get_x() and get_x(DEFAULT) share one instance
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (factory.__name__, tuple(bound.arguments.values()))
+        try:
+            return _instances[key]
+        except KeyError:
+            pass
+        with _lock:
+            if key not in _instances:
+                _instances[key] = factory(*bound.args, **bound.kwargs)
+            return _instances[key]
+
+    return getter
+
+
+def registered():
+    """Names of all lazy singletons."""
+    return sorted(_factories)
+
+
+def loaded():
+    """(name, args) of the singletons that have actually been built."""
+    return sorted(_instances, key=str)
+
+
+# ─── Clients ───
+@lazy_singleton
+def resolve_credentials(key_file=None):
+    """
+    GCP credentials and their project, as (credentials, project_id):
+    Locally with key_file: uses that service account key file
+    Locally with st.secrets: uses service account key from secrets.toml
+    On Cloud Run / otherwise: uses Application Default Credentials
+    A key_file that exists wins, so callers that pass one (the severity
+    predictors) keep using its project. project_id may be None if the
+    source doesn't name one.
+    """
+    from google.oauth2 import service_account
+
+    if key_file and os.path.exists(key_file):
+        credentials = service_account.Credentials.from_service_account_file(key_file, scopes=SCOPES)
+        return credentials, credentials.project_id
+    try:
+        info = st.secrets["gcp_service_account"]
+        credentials = service_account.Credentials.from_service_account_info(info, scopes=SCOPES)
+        return credentials, info.get("project_id")
+    except (KeyError, FileNotFoundError, Exception):
+        pass
+
+    import google.auth
+    return google.auth.default(scopes=SCOPES)
+
+
+def get_credentials(key_file=None):
+    """Shared credentials from resolve_credentials(), refreshed if the token has expired."""
+    credentials, _ = resolve_credentials(key_file)
+    if not credentials.valid:
+        with _refresh_lock:
+            if not credentials.valid:
+                from google.auth.transport.requests import Request
+                credentials.refresh(Request())
+    return credentials
+
+
+@lazy_singleton
+def get_embedding_model(project=PROJECT_ID, location=LOCATION, key_file=None):
+    import vertexai
+    from vertexai.preview.language_models import TextEmbeddingModel
+
+    vertexai.init(project=project, location=location, credentials=get_credentials(key_file))
+    return TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL)
+
+
+@lazy_singleton
+def get_bigquery_client(project, location=LOCATION, key_file=None):
+    from google.cloud import bigquery
+
+    return bigquery.Client(credentials=get_credentials(key_file), project=project, location=location)
+
+
+@lazy_singleton
+def get_genai_client(project=PROJECT_ID, location=LOCATION):
+    from google import genai
+
+    return genai.Client(
+        vertexai=True,
+        project=project,
+        location=location,
+        credentials=get_credentials(),
+    )
+
+
+@lazy_singleton
+def get_collection(name=COLLECTION_NAME):
+    import chromadb
+
+    chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
+    return chroma_client.get_or_create_collection(name=name)
+
+
+def get_predictor_clients():
+    """
+    Clients for the severity model, shared by every predictor entry point.
+    Credentials come from KEY_FILE (credentials.json) when it exists.
+    Returns (bq_client, embedding_model, project_id).
+    """
+    get_credentials(KEY_FILE)  # refresh the shared token if it has expired
+    _, project = resolve_credentials(KEY_FILE)
+    project = project or PREDICTOR_PROJECT_ID
+    return (
+        get_bigquery_client(project, LOCATION, KEY_FILE),
+        get_embedding_model(project, LOCATION, KEY_FILE),
+        project,
+    )
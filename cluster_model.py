@@ -0,0 +1,277 @@
+"""
+Persistent KMeans models for the clustering page, one per candidate k.
+
+For each k, the fitted centroids, the case_ids and embeddings they were fitted
+on, their labels, the fit-time drift baselines and the silhouette score are
+saved as a versioned artifact in store/cluster_model/k<k>/ (v0001.npz,
+v0002.npz, ... plus current.json). On the next run update() only has to
+place what changed:
+
+    - known incidents keep their label
+    - new (or re-embedded) incidents go to the nearest centroid, which then
+      moves towards them (a mini-batch KMeans style running-mean update)
+    - incidents no longer in the data are dropped
+
+A full KMeans refit happens only when the model drifts: mean inertia grows
+past INERTIA_GROWTH x the fit-time value, the 95th percentile of the new
+incidents' assignment distances passes DISTANCE_GROWTH x the fit-time one,
+or more than REFIT_FRACTION of the incidents are new since the last fit.
+
+sweep() does this for several k at once: the KMeans fits that are needed run
+in parallel on a process pool (the workers are module-level functions so
+they can be pickled), and silhouette is computed on a sample of at most
+SILHOUETTE_SAMPLE incidents.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from incident_store import STORE_DIR, atomic_path, read_json, write_json
+
+# ─── Configuration ───
+MODEL_DIR = STORE_DIR / "cluster_model"
+RANDOM_STATE = 42
+INERTIA_GROWTH = 1.25
+DISTANCE_GROWTH = 1.2
+REFIT_FRACTION = 0.3
+KEEP_VERSIONS = 3
+SILHOUETTE_SAMPLE = 2_000
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+
+# ─── Artifact ───
+def _model_dir(k: int):
+    return MODEL_DIR / f"k{k}"
+
+
+def _version_path(k: int, version: int):
+    return _model_dir(k) / f"v{version:04d}.npz"
+
+
+def load_model(k: int):
+    """The current model for k as a dict, or None if none has been fitted yet."""
+    pointer = read_json(_model_dir(k) / "current.json")
+    if pointer is None:
+        return None
+    try:
+        with np.load(_version_path(k, pointer["version"]), allow_pickle=False) as data:
+            model = {name: data[name] for name in data.files}
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+    model["ids"] = model["ids"].astype(str)
+    model.update(pointer)
+    return model
+
+
+def _save_model(model) -> dict:
+    k = int(model["k"])
+    directory = _model_dir(k)
+    previous = load_model(k)
+    version = previous["version"] + 1 if previous else 1
+    with atomic_path(_version_path(k, version)) as tmp:
+        np.savez(
+            tmp,
+            ids=np.asarray(model["ids"], dtype=str),
+            embeddings=model["embeddings"],
+            labels=model["labels"],
+            centroids=model["centroids"],
+            counts=model["counts"],
+        )
+
+    pointer = {
+        "version": version,
+        "k": k,
+        "fitted_version": int(model.get("fitted_version") or version),
+        "fit_inertia": float(model["fit_inertia"]),
+        "fit_distance_p95": float(model["fit_distance_p95"]),
+        "fit_size": int(model["fit_size"]),
+        "changed_since_fit": int(model["changed_since_fit"]),
+        "inertia": float(model["inertia"]),
+        "silhouette": model.get("silhouette"),
+        "saved_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    write_json(directory / "current.json", pointer)
+
+    for old in sorted(directory.glob("v*.npz"))[:-KEEP_VERSIONS]:
+        old.unlink(missing_ok=True)
+    return {**model, **pointer}
+
+
+# ─── Workers (module level so a process pool can pickle them) ───
+def kmeans(embeddings, k):
+    """(labels, centroids) of a fresh KMeans fit."""
+    from sklearn.cluster import KMeans
+
+    km = KMeans(n_clusters=k, random_state=RANDOM_STATE, n_init="auto")
+    labels = km.fit_predict(embeddings).astype(np.int32)
+    return labels, km.cluster_centers_.astype(np.float32)
+
+
+def silhouette(embeddings, labels, sample_size=SILHOUETTE_SAMPLE):
+    """Silhouette score, on a fixed random sample once there are more than sample_size incidents."""
+    from sklearn.metrics import silhouette_score
+
+    if len(np.unique(labels)) < 2:
+        return None
+    sample = sample_size if len(labels) > sample_size else None
+    return float(silhouette_score(embeddings, labels, sample_size=sample, random_state=RANDOM_STATE))
+
+
+def _fit_and_score(embeddings, k):
+    labels, centroids = kmeans(embeddings, k)
+    return labels, centroids, silhouette(embeddings, labels)
+
+
+# ─── Fitting ───
+def _distances(embeddings, centroids, labels):
+    return np.linalg.norm(embeddings - centroids[labels], axis=1)
+
+
+def _save_fit(ids, embeddings, k, labels, centroids, score) -> dict:
+    distances = _distances(embeddings, centroids, labels)
+    mean_inertia = float(np.mean(distances ** 2))
+    return _save_model({
+        "ids": np.asarray(ids, dtype=str),
+        "embeddings": embeddings,
+        "labels": labels,
+        "centroids": centroids,
+        "counts": np.bincount(labels, minlength=k).astype(np.int64),
+        "k": k,
+        "fitted_version": None,  # this version
+        "fit_inertia": mean_inertia,
+        "fit_distance_p95": float(np.percentile(distances, 95)),
+        "fit_size": len(labels),
+        "changed_since_fit": 0,
+        "inertia": mean_inertia,
+        "silhouette": score,
+    })
+
+
+def fit(ids, embeddings, k) -> dict:
+    """Fit KMeans from scratch and save it as a new version."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    return _save_fit(ids, embeddings, k, *_fit_and_score(embeddings, k))
+
+
+def assign(embeddings, centroids):
+    """Nearest centroid for each embedding, with its distance."""
+    # Squared euclidean via the dot-product expansion, without an (n, k, d) temporary
+    sq = (
+        np.sum(embeddings ** 2, axis=1, keepdims=True)
+        - 2 * embeddings @ centroids.T
+        + np.sum(centroids ** 2, axis=1)
+    )
+    labels = np.argmin(sq, axis=1).astype(np.int32)
+    distances = np.sqrt(np.maximum(sq[np.arange(len(labels)), labels], 0))
+    return labels, distances
+
+
+def _incremental(ids, embeddings, k):
+    """
+    Bring the saved model for k up to date without refitting, if drift allows.
+
+    Returns:
+        (labels, model, info), or (None, None, info) when a refit is needed,
+        with the reason in info["reason"].
+    """
+    model = load_model(k)
+    if model is None:
+        return None, None, {"action": "fit", "reason": "no saved model", "new": len(ids), "removed": 0}
+    if model["embeddings"].shape[1] != embeddings.shape[1]:
+        return None, None, {"action": "fit", "reason": "embedding dimensionality changed",
+                            "new": len(ids), "removed": 0}
+
+    # Match incidents to the saved model; an incident whose text (and so
+    # embedding) changed counts as new
+    position = {case_id: i for i, case_id in enumerate(model["ids"])}
+    old_rows = np.array([position.get(case_id, -1) for case_id in ids])
+    known = old_rows >= 0
+    known[known] = np.all(model["embeddings"][old_rows[known]] == embeddings[known], axis=1)
+    new = ~known
+    removed = int((~np.isin(model["ids"], ids)).sum())
+
+    if not new.any() and removed == 0:
+        return model["labels"][old_rows], model, {"action": "reuse", "new": 0, "removed": 0}
+
+    centroids = model["centroids"].copy()
+    counts = model["counts"].copy()
+    labels = np.empty(len(ids), dtype=np.int32)
+    labels[known] = model["labels"][old_rows[known]]
+
+    new_distances = np.empty(0, dtype=np.float32)
+    if new.any():
+        new_labels, new_distances = assign(embeddings[new], centroids)
+        labels[new] = new_labels
+        # Mini-batch KMeans update: each centroid moves towards its new members
+        # by a step that shrinks as the cluster grows
+        for label, x in zip(new_labels, embeddings[new]):
+            counts[label] += 1
+            centroids[label] += (x - centroids[label]) / counts[label]
+
+    distances = _distances(embeddings, centroids, labels)
+    inertia = float(np.mean(distances ** 2))
+    changed_since_fit = model["changed_since_fit"] + int(new.sum()) + removed
+    info = {"new": int(new.sum()), "removed": removed}
+    if inertia > INERTIA_GROWTH * model["fit_inertia"]:
+        reason = f"inertia grew {inertia / model['fit_inertia']:.2f}x since the last fit"
+    elif len(new_distances) and np.percentile(new_distances, 95) > DISTANCE_GROWTH * model["fit_distance_p95"]:
+        reason = "new incidents are far from every cluster"
+    elif changed_since_fit > REFIT_FRACTION * model["fit_size"]:
+        reason = f"{changed_since_fit} incidents changed since the last fit"
+    else:
+        reason = None
+    if reason:
+        return None, None, {**info, "action": "fit", "reason": reason}
+
+    model = _save_model({
+        **model,
+        "ids": ids,
+        "embeddings": embeddings,
+        "labels": labels,
+        "centroids": centroids,
+        "counts": np.bincount(labels, minlength=k).astype(np.int64),
+        "changed_since_fit": changed_since_fit,
+        "inertia": inertia,
+        "silhouette": silhouette(embeddings, labels),
+    })
+    return labels, model, {**info, "action": "assign"}
+
+
+def update(ids, embeddings, k):
+    """
+    Labels for ids (aligned with embeddings), reusing the saved model for k
+    where possible.
+
+    Returns:
+        (labels array, model dict, info dict). info has "action" ("fit",
+        "assign" or "reuse"), "new", "removed" and, on a refit, "reason".
+    """
+    return sweep(ids, embeddings, [k], max_workers=1)[k]
+
+
+def sweep(ids, embeddings, ks, max_workers=MAX_WORKERS):
+    """
+    update() for every k in ks; the refits that are needed run in parallel
+    on a process pool.
+
+    Returns:
+        {k: (labels, model, info)}; model["silhouette"] holds each k's score.
+    """
+    ids = np.asarray(ids, dtype=str)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    results = {k: _incremental(ids, embeddings, k) for k in ks}
+    to_fit = [k for k, (labels, _, _) in results.items() if labels is None]
+
+    if len(to_fit) > 1 and max_workers > 1:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(to_fit))) as pool:
+            fitted = dict(zip(to_fit, pool.map(_fit_and_score, [embeddings] * len(to_fit), to_fit)))
+    else:
+        fitted = {k: _fit_and_score(embeddings, k) for k in to_fit}
+
+    for k, (labels, centroids, score) in fitted.items():
+        model = _save_fit(ids, embeddings, k, labels, centroids, score)
+        results[k] = (model["labels"], model, results[k][2])
+    return results
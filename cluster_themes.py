@@ -0,0 +1,115 @@
+"""
+Gemini-written titles and summaries for incident clusters.
+
+Themes are generated for all clusters concurrently (under the shared "gemini"
+rate limit, with retry on quota errors) and persisted in store/cluster_themes/,
+one JSON file per cluster keyed by a fingerprint of the prompt version, the
+model and the cluster's member case_ids. A cluster whose membership hasn't
+changed is never sent to the model again — across reruns, restarts and
+unrelated data changes. Bump PROMPT_VERSION whenever the prompt changes.
+"""
+
+import hashlib
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import rate_limit
+from clients import get_genai_client
+from incident_store import STORE_DIR, read_json, write_json
+
+logger = logging.getLogger(__name__)
+
+# ─── Configuration ───
+THEME_DIR = STORE_DIR / "cluster_themes"
+THEME_MODEL = "gemini-2.0-flash"
+PROMPT_VERSION = 1
+SAMPLE_SIZE = 15  # incidents shown to the model per cluster
+CONCURRENCY = 4
+
+PROMPT = """
+        You are a senior safety analyst. Below are incident descriptions from a specific cluster.
+        Analyze them to identify the root cause pattern and key risks.
+
+        Incidents:
+        {text_blob}
+
+        Task: Return a JSON object with:
+        1. "title": A short, specific title (3-6 words).
+        2. "summary": A list of exactly 3 short bullet points summarizing the key risk, common cause, and a recommended focus area.
+
+        Example Output:
+        {{
+            "title": "Contractor LOTO Violations",
+            "summary": [
+                "High frequency of Lockout/Tagout violations during contractor shift changes.",
+                "Root causes often involve unclear verbal communication of isolation points.",
+                "Focus on digital verification and localized supervision for contractors."
+            ]
+        }}
+        Return ONLY valid JSON.
+        """
+
+
+def theme_key(case_ids) -> str:
+    """Fingerprint of a cluster: prompt version, model and sorted member case_ids."""
+    members = "\n".join(sorted(map(str, case_ids)))
+    return hashlib.sha1(f"{PROMPT_VERSION}\0{THEME_MODEL}\0{members}".encode("utf-8")).hexdigest()
+
+
+def _theme_path(key: str):
+    return THEME_DIR / f"{key}.json"
+
+
+def _generate(client, texts):
+    prompt = PROMPT.format(text_blob="\n- ".join(texts))
+    response = rate_limit.with_retry(
+        client.models.generate_content,
+        model=THEME_MODEL,
+        contents=prompt,
+        config={"response_mime_type": "application/json"},
+        limit="gemini",
+    )
+    return json.loads(response.text)
+
+
+def generate_cluster_themes(df, cluster_col, text_col, project_id, region, stats=None):
+    """
+    Theme ({"title", "summary"}) per cluster id. Cached clusters are read from
+    disk; the rest are generated concurrently. A failed cluster gets an error
+    placeholder, which is not cached.
+
+    stats (if given) is filled with cached and generated counts.
+    """
+    themes, pending = {}, {}
+    for cid, members in df.groupby(cluster_col):
+        key = theme_key(members["case_id"])
+        cached = read_json(_theme_path(key))
+        if cached is not None:
+            themes[cid] = cached
+            continue
+        sample = members[text_col].sample(n=min(SAMPLE_SIZE, len(members)), random_state=42)
+        pending[cid] = (key, sample.tolist())
+
+    if pending:
+        client = get_genai_client(project_id, region)
+
+        def run(item):
+            cid, (key, texts) = item
+            try:
+                theme = _generate(client, texts)
+            except Exception as e:
+                logger.error("Error generating theme for cluster %s: %s", cid, e)
+                return cid, {
+                    "title": f"Error: {str(e)[:50]}...",
+                    "summary": ["Could not generate summary due to an error."],
+                }
+            write_json(_theme_path(key), theme)
+            return cid, theme
+
+        with ThreadPoolExecutor(max_workers=min(CONCURRENCY, len(pending))) as pool:
+            themes.update(pool.map(run, pending.items()))
+
+    if stats is not None:
+        stats.update({"cached": len(themes) - len(pending), "generated": len(pending)})
+    return {cid: themes[cid] for cid in sorted(themes)}
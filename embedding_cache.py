@@ -0,0 +1,218 @@
+"""
+Persistent, content-addressed embedding cache.
+
+Every embedding call site (SafeBot, clustering, the severity predictors, the
+ingestion notebook) goes through embed(). Vectors are keyed by
+(model, dimensionality, hash of the normalized text) and stored as raw float32
+blobs in store/embeddings.sqlite, so an identical text is embedded once and
+then served from disk — across sessions, processes and restarts. The cache is
+bounded to MAX_ENTRIES, evicting the least recently used vectors.
+
+SQLite (rather than a hand-rolled memmap + index) gives atomic inserts and
+eviction when several Cloud Run workers share the cache.
+
+Cache misses are embedded in batches of batch_size, up to `concurrency`
+batches in flight, under the shared "embedding" rate limit with jittered
+retry on quota errors (see rate_limit.py). Results keep input order.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import rate_limit
+from clients import EMBEDDING_MODEL, LOCATION, PROJECT_ID, get_embedding_model
+from incident_store import STORE_DIR
+
+# ─── Configuration ───
+CACHE_PATH = STORE_DIR / "embeddings.sqlite"
+DIMENSIONALITY = 768
+MAX_ENTRIES = 100_000  # ~300 MB of 768-d float32 vectors
+BATCH_SIZE = 16  # texts per embedding API call
+CONCURRENCY = 4  # embedding API calls in flight
+_SQL_CHUNK = 500  # stay under SQLite's bound-parameter limit
+
+_local = threading.local()
+_session = {"hits": 0, "misses": 0}  # this process only
+_session_lock = threading.Lock()
+
+
+# ─── Helpers ───
+def normalize_text(text) -> str:
+    """Canonical form used for both the cache key and the text sent to the model."""
+    if text is None or text != text:  # None / NaN
+        return ""
+    text = unicodedata.normalize("NFC", str(text))
+    return " ".join(text.split())
+
+
+def _key(model: str, dimensionality: int, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{dimensionality}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _connect() -> sqlite3.Connection:
+    """One connection per thread; created (with the schema) on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        STORE_DIR.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(CACHE_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings (last_used);
+            CREATE TABLE IF NOT EXISTS stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+        """)
+        _local.conn = conn
+    return conn
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _lookup(conn, keys):
+    found = {}
+    for chunk in _chunks(keys, _SQL_CHUNK):
+        placeholders = ",".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+        ).fetchall()
+        found.update((k, np.frombuffer(v, dtype=np.float32)) for k, v in rows)
+    return found
+
+
+def _embed_remote(texts, model, dimensionality, project, location, key_file, batch_size,
+                  concurrency):
+    if model != EMBEDDING_MODEL:
+        raise ValueError(f"Unsupported embedding model: {model}")
+    embedding_model = get_embedding_model(project, location, key_file)
+
+    def embed_batch(batch):
+        response = rate_limit.with_retry(
+            embedding_model.get_embeddings, batch,
+            output_dimensionality=dimensionality, limit="embedding",
+        )
+        return [e.values for e in response]
+
+    batches = list(_chunks(texts, batch_size))
+    if concurrency <= 1 or len(batches) <= 1:
+        results = [embed_batch(batch) for batch in batches]
+    else:
+        # map() yields in submission order, so vectors stay aligned with texts
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(batches))) as pool:
+            results = list(pool.map(embed_batch, batches))
+    return np.asarray([v for vectors in results for v in vectors], dtype=np.float32)
+
+
+def _store(conn, entries, hits, misses):
+    now = time.time()
+    with conn:
+        if hits:
+            conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(now, k) for k in hits],
+            )
+        if entries:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(k, v.tobytes(), now) for k, v in entries.items()],
+            )
+            excess = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - MAX_ENTRIES
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+        conn.executemany(
+            "INSERT INTO stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            [("hits", len(hits)), ("misses", misses)],
+        )
+
+
+# ─── Public API ───
+def embed(texts, model=EMBEDDING_MODEL, dimensionality=DIMENSIONALITY,
+          project=PROJECT_ID, location=LOCATION, key_file=None, batch_size=BATCH_SIZE,
+          concurrency=CONCURRENCY):
+    """
+    Embed texts, calling the model only for texts not already cached.
+
+    Args:
+        texts: Iterable of strings (None/NaN are treated as empty).
+        model, dimensionality: Part of the cache key.
+        project, location, key_file: Which pooled Vertex AI client to use on a miss.
+        batch_size: Texts per embedding API call.
+        concurrency: Embedding API calls in flight at once.
+
+    Returns:
+        float32 array of shape (len(texts), dimensionality), in input order.
+    """
+    normalized = [normalize_text(t) for t in texts]
+    keys = [_key(model, dimensionality, t) for t in normalized]
+    unique = list(dict.fromkeys(keys))
+
+    conn = _connect()
+    vectors = _lookup(conn, unique)
+    missing = [k for k in unique if k not in vectors]
+    if missing:
+        text_for = dict(zip(keys, normalized))
+        fresh = _embed_remote(
+            [text_for[k] for k in missing], model, dimensionality,
+            project, location, key_file, batch_size, concurrency,
+        )
+        new_entries = dict(zip(missing, fresh))
+        vectors.update(new_entries)
+    else:
+        new_entries = {}
+
+    hits = [k for k in unique if k not in new_entries]
+    _store(conn, new_entries, hits, len(missing))
+    with _session_lock:
+        _session["hits"] += len(hits)
+        _session["misses"] += len(missing)
+
+    if not keys:
+        return np.empty((0, dimensionality), dtype=np.float32)
+    return np.stack([vectors[k] for k in keys])
+
+
+def stats() -> dict:
+    """
+    Hit/miss counts (per distinct text in a call) and hit rate, both all-time
+    (persisted) and for this process.
+    """
+    conn = _connect()
+    totals = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+    entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def rate(hits, misses):
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    hits, misses = totals.get("hits", 0), totals.get("misses", 0)
+    with _session_lock:
+        session = dict(_session)
+    return {
+        "entries": entries,
+        "max_entries": MAX_ENTRIES,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": rate(hits, misses),
+        "session_hits": session["hits"],
+        "session_misses": session["misses"],
+        "session_hit_rate": rate(session["hits"], session["misses"]),
+    }
@@ -0,0 +1,191 @@
+"""
+Pre-aggregated incident counts for the home dashboard.
+
+The cube is a dense count array with one axis per field in DIMENSIONS and one
+slot per distinct value (slot 0 holds reports where the field is missing).
+Every dashboard chart and filter combination is a slice-and-sum over the
+cube, so its cost depends on the number of distinct values, not on the
+number of incidents.
+
+refresh() keeps the cube in step with the incident store. When the only
+change since the last refresh is new journal submissions, those reports are
+folded in one by one. A changed workbook (compact(), or a hand edit) rebuilds
+the cube in one vectorized pass.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from incident_store import data_version, load_reports
+
+# ─── Configuration ───
+DIMENSIONS = ["date", "location", "severity", "category", "risk_level"]
+
+_lock = threading.Lock()
+_state = {"cube": None}
+
+
+def _label(value):
+    """Hashable label for a field value; None when missing. 2025.0 and 2025 are one label."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+# ─── Building ───
+def _empty_cube() -> dict:
+    return {
+        "labels": {dim: [None] for dim in DIMENSIONS},
+        "index": {dim: {None: 0} for dim in DIMENSIONS},
+        "counts": np.zeros((1,) * len(DIMENSIONS), dtype=np.int64),
+        "columns": [],
+        "rows": 0,
+        "last_case": None,
+    }
+
+
+def _build(reports) -> dict:
+    """The cube for reports, from factorized codes and one bincount."""
+    cube = _empty_cube()
+    if reports is None or not len(reports):
+        return cube
+    codes = []
+    for dim in DIMENSIONS:
+        labels, index = cube["labels"][dim], cube["index"][dim]
+        if dim not in reports.columns:
+            codes.append(np.zeros(len(reports), dtype=np.int64))
+            continue
+        dim_codes, uniques = pd.factorize(reports[dim])
+        # Map each distinct raw value to its label's slot; -1 (missing) -> 0
+        slots = np.zeros(len(uniques) + 1, dtype=np.int64)
+        for i, value in enumerate(uniques):
+            label = _label(value)
+            if label not in index:
+                index[label] = len(labels)
+                labels.append(label)
+            slots[i + 1] = index[label]
+        codes.append(slots[dim_codes + 1])
+    shape = tuple(len(cube["labels"][dim]) for dim in DIMENSIONS)
+    flat = np.ravel_multi_index(codes, shape)
+    cube["counts"] = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+    cube["columns"] = [dim for dim in DIMENSIONS if dim in reports.columns]
+    cube["rows"] = len(reports)
+    cube["last_case"] = reports["case_id"].iat[-1]
+    return cube
+
+
+def _fold(cube, reports) -> dict:
+    """A copy of cube with the reports after cube["rows"] added."""
+    labels = {dim: list(v) for dim, v in cube["labels"].items()}
+    index = {dim: dict(v) for dim, v in cube["index"].items()}
+    counts = cube["counts"].copy()
+    for report in reports.iloc[cube["rows"]:].to_dict("records"):
+        cell = []
+        for axis, dim in enumerate(DIMENSIONS):
+            label = _label(report.get(dim))
+            if label not in index[dim]:
+                index[dim][label] = len(labels[dim])
+                labels[dim].append(label)
+                pad = [(0, 0)] * len(DIMENSIONS)
+                pad[axis] = (0, 1)
+                counts = np.pad(counts, pad)
+            cell.append(index[dim][label])
+        counts[tuple(cell)] += 1
+    return {
+        "labels": labels,
+        "index": index,
+        "counts": counts,
+        "columns": [dim for dim in DIMENSIONS if dim in reports.columns],
+        "rows": len(reports),
+        "last_case": reports["case_id"].iat[-1],
+    }
+
+
+def refresh() -> dict:
+    """The cube for the store's current data, folding in or rebuilding as needed."""
+    version = data_version()
+    cube = _state["cube"]
+    if cube is not None and cube["version"] == version:
+        return cube
+    with _lock:
+        cube = _state["cube"]
+        if cube is not None and cube["version"] == version:
+            return cube
+        reports = load_reports()
+        # Submissions are appended after the rows already counted, so with the
+        # same workbook and an unchanged prefix only the new rows need adding
+        appended = (
+            cube is not None and reports is not None
+            and cube["version"][0] == version[0]
+            and cube["rows"] > 0 and len(reports) >= cube["rows"]
+            and reports["case_id"].iat[cube["rows"] - 1] == cube["last_case"]
+        )
+        cube = _fold(cube, reports) if appended else _build(reports)
+        cube["version"] = version
+        _state["cube"] = cube
+        return cube
+
+
+# ─── Slicing ───
+def dimensions():
+    """The DIMENSIONS present in the data."""
+    return list(refresh()["columns"])
+
+
+def counts(by, where=None, dropna=True) -> pd.Series:
+    """
+    Incident counts per combination of the `by` fields, like
+    reports.groupby(by, dropna=dropna).size() (combinations with no
+    incidents are left out).
+
+    Args:
+        by: List of fields from DIMENSIONS.
+        where: Optional {field: allowed values}; only matching incidents count.
+        dropna: Leave out combinations where a field is missing; otherwise
+            they are kept with None for that field.
+
+    Returns:
+        Series named "count", indexed by the `by` fields (a MultiIndex when
+        there are several) and sorted by them.
+    """
+    cube = refresh()
+    slots = {dim: range(len(cube["labels"][dim])) for dim in DIMENSIONS}
+    for dim, allowed in (where or {}).items():
+        index = cube["index"][dim]
+        slots[dim] = sorted({index[label] for label in map(_label, allowed) if label in index})
+    if dropna:
+        for dim in by:
+            slots[dim] = [s for s in slots[dim] if s != 0]
+
+    sliced = cube["counts"][np.ix_(*[np.asarray(slots[dim], dtype=np.intp) for dim in DIMENSIONS])]
+    others = tuple(axis for axis, dim in enumerate(DIMENSIONS) if dim not in by)
+    totals = sliced.sum(axis=others)
+    # Axes are left in DIMENSIONS order; put them in the requested order
+    kept = [dim for dim in DIMENSIONS if dim in by]
+    totals = np.transpose(totals, [kept.index(dim) for dim in by])
+
+    nonzero = np.nonzero(totals)
+    levels = [
+        [cube["labels"][dim][slots[dim][i]] for i in positions]
+        for dim, positions in zip(by, nonzero)
+    ]
+    if len(by) == 1:
+        index = pd.Index(levels[0], name=by[0])
+    else:
+        index = pd.MultiIndex.from_arrays(levels, names=by)
+    result = pd.Series(totals[nonzero], index=index, name="count")
+    try:
+        return result.sort_index()
+    except TypeError:  # mixed label types (e.g. years and free text)
+        return result
+
+
+def values(dim, where=None):
+    """Sorted distinct values of dim among incidents matching where."""
+    return counts([dim], where).index.tolist()
@@ -0,0 +1,385 @@
+"""
+Structured metadata for the safety_incidents Chroma collection.
+
+Each indexed incident carries location, severity, risk_level, category,
+injury_category and year (from the report's date) as Chroma metadata, so
+SafeBot can push filters such as "incidents in Trinidad since 2022" into the
+vector query itself instead of scoring and shipping the whole corpus.
+
+Filters are a dict of field -> list of allowed values, plus optional
+"year_from" / "year_to" bounds (inclusive). They come from the SafeBot page
+controls and from parse_filters() on the question text; build_where() turns
+them into a Chroma where clause and matching_case_ids() into the equivalent
+case_id set for the keyword index.
+
+sync_index() keeps the collection in step with the incident store: it upserts
+(by case_id) only incidents that are new or whose text or metadata changed
+since the last sync, detected by a hash per incident kept in
+store/chroma_index.json alongside the store's data_version() watermark.
+Submissions trigger it in the background, so a new report is searchable
+within seconds instead of waiting for a notebook rebuild.
+
+USAGE:
+    python incident_index.py backfill   # attach metadata to an existing collection
+    python incident_index.py sync       # index new / changed incidents
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+import pandas as pd
+
+from incident_store import STORE_DIR, data_watermark, load_reports, read_json, write_json
+from incident_vectors import incident_text, vectors_for
+
+logger = logging.getLogger(__name__)
+
+# ─── Configuration ───
+METADATA_FIELDS = ["location", "severity", "risk_level", "category", "injury_category"]
+METADATA_VERSION = 1  # bump when the metadata recipe changes; triggers a backfill
+_UPDATE_CHUNK = 500
+STATE_PATH = STORE_DIR / "chroma_index.json"
+
+_sync_lock = threading.Lock()
+
+# Fields whose values are distinctive enough to pick out of a free-text
+# question; category ("Safety", "Incident", ...) is only set from the UI
+_QUESTION_FIELDS = ["location", "severity", "risk_level", "injury_category"]
+# How a value must appear in the question to count ({v} is the value).
+# Risk levels and severities are everyday words ("high", "a serious
+# outcome", "major hazards"), so they need "high risk" / "high-risk",
+# "serious incidents", "severity: major" or "major severity"
+_VALUE_PATTERNS = {
+    "risk_level": r"\b{v}[- ]risk\b",
+    "severity": r"\b(?:{v}[- ]severity|severity(?: level)?(?::| of| is)? {v}"
+                r"|{v} (?:incidents?|events?|cases?|reports?))\b",
+}
+_YEAR = r"((?:19|20)\d{2})"
+_YEAR_PATTERNS = [
+    (re.compile(rf"\bbetween {_YEAR} and {_YEAR}\b"), lambda a, b: (int(a), int(b))),
+    (re.compile(rf"\bfrom {_YEAR} (?:to|through|until) {_YEAR}\b"), lambda a, b: (int(a), int(b))),
+    (re.compile(rf"\b(?:since|from|starting) {_YEAR}\b"), lambda a: (int(a), None)),
+    (re.compile(rf"\bafter {_YEAR}\b"), lambda a: (int(a) + 1, None)),
+    (re.compile(rf"\bbefore {_YEAR}\b"), lambda a: (None, int(a) - 1)),
+    (re.compile(rf"\b(?:until|through|up to) {_YEAR}\b"), lambda a: (None, int(a))),
+    (re.compile(rf"\b(?:in|during) {_YEAR}\b"), lambda a: (int(a), int(a))),
+]
+
+
+# ─── Metadata ───
+def incident_years(reports: pd.DataFrame) -> pd.Series:
+    """Year of each report: the date column holds either a year or a full date."""
+    dates = reports["date"]
+    years = pd.to_numeric(dates, errors="coerce")
+    is_year = years.between(1900, 2100)
+    parsed = pd.to_datetime(dates.where(~is_year), errors="coerce").dt.year
+    return years.where(is_year, parsed).astype("Int64")
+
+
+def incident_metadata(reports: pd.DataFrame):
+    """
+    Chroma metadata for each report, in row order. Missing values are left out
+    (Chroma metadata cannot hold None).
+    """
+    columns = {f: reports[f] for f in METADATA_FIELDS if f in reports.columns}
+    if "date" in reports.columns:
+        columns["year"] = incident_years(reports)
+    metadatas = []
+    for i in range(len(reports)):
+        meta = {}
+        for field, values in columns.items():
+            value = values.iloc[i]
+            if pd.isna(value) or value == "":
+                continue
+            meta[field] = int(value) if field == "year" else str(value)
+        metadatas.append(meta)
+    return metadatas
+
+
+def collection_metadata(collection) -> dict:
+    """User metadata of the collection, without the hnsw:* settings Chroma won't let us resend."""
+    return {k: v for k, v in (collection.metadata or {}).items() if not k.startswith("hnsw:")}
+
+
+def backfill(collection=None) -> int:
+    """
+    Attach metadata from the incident store to every incident already in the
+    collection. Returns the number of incidents updated.
+    """
+    if collection is None:
+        from clients import get_collection
+        collection = get_collection()
+    reports = load_reports()
+    updated = 0
+    if reports is not None and len(reports):
+        indexed = set(collection.get(include=[])["ids"])
+        reports = reports[reports["case_id"].astype(str).isin(indexed)]
+        ids = reports["case_id"].astype(str).tolist()
+        metadatas = incident_metadata(reports)
+        for i in range(0, len(ids), _UPDATE_CHUNK):
+            collection.update(ids=ids[i:i + _UPDATE_CHUNK], metadatas=metadatas[i:i + _UPDATE_CHUNK])
+        updated = len(ids)
+    collection.modify(metadata={**collection_metadata(collection), "metadata_version": METADATA_VERSION})
+    return updated
+
+
+def ensure_metadata(collection) -> None:
+    """Backfill once if the collection predates (this version of) the metadata."""
+    if (collection.metadata or {}).get("metadata_version") != METADATA_VERSION:
+        backfill(collection)
+
+
+# ─── Filters ───
+def parse_filters(question: str) -> dict:
+    """
+    Filters named in a question: known locations, severities ("serious
+    incidents", "severity: major"), risk levels ("high risk") and injury
+    categories, and year ranges ("in 2021", "since 2022",
+    "between 2019 and 2021", "before 2020").
+    """
+    filters = {}
+    text = question.lower()
+    reports = load_reports()
+    if reports is not None:
+        for field in _QUESTION_FIELDS:
+            if field not in reports.columns:
+                continue
+            pattern = _VALUE_PATTERNS.get(field, r"\b{v}\b")
+            values = reports[field].dropna().astype(str).unique()
+            found = [v for v in values if re.search(pattern.format(v=re.escape(v.lower())), text)]
+            if found:
+                filters[field] = sorted(found)
+    for pattern, bounds in _YEAR_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            year_from, year_to = bounds(*match.groups())
+            if year_from is not None:
+                filters["year_from"] = year_from
+            if year_to is not None:
+                filters["year_to"] = year_to
+            break
+    return filters
+
+
+def merge_filters(*filter_dicts) -> dict:
+    """Combine filters; later dicts win per field (UI controls override the question)."""
+    merged = {}
+    for filters in filter_dicts:
+        for field, value in (filters or {}).items():
+            if value not in (None, [], ()):
+                merged[field] = value
+    return merged
+
+
+def build_where(filters):
+    """Chroma where clause for filters, or None if there is nothing to filter on."""
+    clauses = [
+        {field: {"$in": list(filters[field])}}
+        for field in METADATA_FIELDS if filters.get(field)
+    ]
+    if filters.get("year_from") is not None:
+        clauses.append({"year": {"$gte": int(filters["year_from"])}})
+    if filters.get("year_to") is not None:
+        clauses.append({"year": {"$lte": int(filters["year_to"])}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def matching_case_ids(filters):
+    """case_ids in the store that satisfy filters, or None if filters is empty."""
+    if build_where(filters) is None:
+        return None
+    reports = load_reports()
+    if reports is None:
+        return set()
+    mask = pd.Series(True, index=reports.index)
+    for field in METADATA_FIELDS:
+        if filters.get(field) and field in reports.columns:
+            mask &= reports[field].astype(str).isin([str(v) for v in filters[field]])
+    if "date" in reports.columns:
+        years = incident_years(reports)
+        if filters.get("year_from") is not None:
+            mask &= (years >= int(filters["year_from"])).fillna(False)
+        if filters.get("year_to") is not None:
+            mask &= (years <= int(filters["year_to"])).fillna(False)
+    return set(reports.loc[mask, "case_id"].astype(str))
+
+
+def describe_filters(filters) -> str:
+    """Short human-readable form, e.g. 'location: Trinidad · 2022–'."""
+    parts = [
+        f"{field.replace('_', ' ')}: {', '.join(map(str, filters[field]))}"
+        for field in METADATA_FIELDS if filters.get(field)
+    ]
+    year_from, year_to = filters.get("year_from"), filters.get("year_to")
+    if year_from is not None or year_to is not None:
+        if year_from == year_to:
+            parts.append(str(year_from))
+        else:
+            parts.append(f"{year_from or ''}–{year_to or ''}")
+    return " · ".join(parts)
+
+
+# ─── Incremental indexing ───
+def _content_hash(document: str, metadata: dict) -> str:
+    payload = json.dumps([document, metadata], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _document_hash(document: str) -> str:
+    return hashlib.sha1(document.encode("utf-8")).hexdigest()
+
+
+def reset_state() -> None:
+    """Forget the sync state; the next sync re-checks every incident against the collection."""
+    try:
+        os.remove(STATE_PATH)
+    except FileNotFoundError:
+        pass
+
+
+def bump_version(collection) -> None:
+    """Mark the collection's contents as changed (and its metadata as current)."""
+    meta = collection_metadata(collection)
+    meta["version"] = int(meta.get("version", 0)) + 1
+    meta["metadata_version"] = METADATA_VERSION
+    collection.modify(metadata=meta)
+
+
+def _seed_hashes(collection) -> dict:
+    """
+    (document hash, content hash) of each incident the collection already
+    holds, so a first sync skips incidents indexed as they are in the store
+    and only attaches metadata to those indexed with the same text.
+    """
+    existing = collection.get(include=["documents", "metadatas"])
+    return {
+        doc_id: (_document_hash(doc or ""), _content_hash(doc, meta or {}))
+        for doc_id, doc, meta in zip(existing["ids"], existing["documents"], existing["metadatas"])
+    }
+
+
+def sync_index(collection=None, force=False) -> dict:
+    """
+    Upsert new and changed incidents into the collection, and drop incidents
+    this indexer put there that have since left the store. Ids it never
+    indexed (e.g. rows bulk-loaded with ingest.py --source) are left alone.
+
+    Nothing is read or embedded when the store's data_version() still matches
+    the last sync's watermark (unless force=True). Otherwise every incident's
+    document and metadata is hashed and only those whose hash changed are
+    upserted, with their vectors taken from the incident vector store
+    (incident_vectors.py), which embeds only text it hasn't seen. On a first
+    sync, incidents the collection already holds with the same text (e.g.
+    from the notebook, without metadata) only get their metadata updated. The
+    collection's "version" metadata is bumped on any change, which invalidates
+    SafeBot's answer cache.
+
+    Returns:
+        dict with upserted, relabelled (metadata-only updates), deleted and
+        indexed counts (skipped=True if the watermark had not moved or another
+        sync was already running).
+    """
+    if not _sync_lock.acquire(blocking=False):
+        return {"skipped": True, "upserted": 0, "deleted": 0}
+    try:
+        if collection is None:
+            from clients import get_collection
+            collection = get_collection()
+        watermark = data_watermark()
+        state = read_json(STATE_PATH)
+        seeded = {}
+        if state is None:
+            # Seeded hashes only spare a re-upsert; they never make an id
+            # ours to delete, since the collection may hold rows from elsewhere
+            state = {"watermark": None, "hashes": {}}
+            seeded = _seed_hashes(collection)
+        elif state["watermark"] == watermark and not force:
+            return {"skipped": True, "upserted": 0, "deleted": 0, "indexed": len(state["hashes"])}
+
+        reports = load_reports()
+        if reports is None:
+            reports = pd.DataFrame(columns=["case_id"])
+        ids = reports["case_id"].astype(str).tolist()
+        documents = incident_text(reports).tolist()
+        metadatas = incident_metadata(reports)
+        hashes = [_content_hash(d, m) for d, m in zip(documents, metadatas)]
+
+        old = state["hashes"]
+        changed, relabelled = [], []
+        for i, (case_id, document, h) in enumerate(zip(ids, documents, hashes)):
+            if old.get(case_id) == h:
+                continue
+            seed_document, seed_content = seeded.get(case_id, (None, None))
+            if seed_content == h:
+                continue
+            if seed_document == _document_hash(document) and metadatas[i]:
+                relabelled.append(i)  # same text and vector, only the metadata differs
+            else:
+                changed.append(i)
+        removed = sorted(set(old) - set(ids))
+
+        for start in range(0, len(changed), _UPDATE_CHUNK):
+            chunk = changed[start:start + _UPDATE_CHUNK]
+            embeddings = vectors_for([ids[i] for i in chunk])
+            collection.upsert(
+                ids=[ids[i] for i in chunk],
+                documents=[documents[i] for i in chunk],
+                metadatas=[metadatas[i] or None for i in chunk],
+                embeddings=embeddings.tolist(),
+            )
+        for start in range(0, len(relabelled), _UPDATE_CHUNK):
+            chunk = relabelled[start:start + _UPDATE_CHUNK]
+            collection.update(ids=[ids[i] for i in chunk], metadatas=[metadatas[i] for i in chunk])
+        if removed:
+            collection.delete(ids=removed)
+
+        if changed or relabelled or removed:
+            bump_version(collection)
+
+        write_json(STATE_PATH, {"watermark": watermark, "hashes": dict(zip(ids, hashes))})
+        return {
+            "skipped": False,
+            "upserted": len(changed),
+            "relabelled": len(relabelled),
+            "deleted": len(removed),
+            "indexed": len(ids),
+        }
+    finally:
+        _sync_lock.release()
+
+
+def _sync_quietly() -> None:
+    try:
+        result = sync_index()
+        if not result["skipped"]:
+            logger.info("Indexed incidents: %s", result)
+    except Exception:
+        logger.exception("Incremental Chroma indexing failed")
+
+
+def sync_in_background() -> None:
+    """Start sync_index() on a daemon thread (no-op if one is already running)."""
+    threading.Thread(target=_sync_quietly, daemon=True).start()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Incident index maintenance")
+    parser.add_argument("command", choices=["backfill", "sync"])
+    args = parser.parse_args()
+    if args.command == "backfill":
+        print(f"Attached metadata to {backfill()} incidents.")
+    elif args.command == "sync":
+        result = sync_index(force=True)
+        if result["skipped"]:
+            print("Sync skipped: another sync is already running.")
+        else:
+            print(f"Upserted {result['upserted']}, updated metadata of {result['relabelled']}, "
+                  f"deleted {result['deleted']}, {result['indexed']} incidents indexed.")
@@ -0,0 +1,535 @@
+"""
+Shared incident data access.
+
+Every page used to call pd.read_excel on base_reports.xlsx / actions.xlsx on
+each Streamlit rerun. This module keeps a Parquet mirror of each workbook in
+store/, rebuilds it only when the workbook changes (mtime/size, confirmed by a
+content hash) and hands every caller the same in-process DataFrame.
+
+New submissions are appended to store/journal.jsonl instead of rewriting the
+workbooks; readers see the workbook plus the journal, and compact() folds the
+journal back into the workbooks. Case IDs come from a locked sequence file,
+so concurrent sessions (and processes) never hand out the same CASE-xxx.
+
+store/manifest.json holds the dataset summary shown in the sidebar (counts,
+locations, last write, schema fingerprint). It is updated in place on every
+write, so reading it never touches the data itself.
+
+Modules that keep their own state under store/ write it with atomic_path() /
+write_json() and compare data_watermark() with the watermark they stored.
+
+The returned frames are shared across sessions — treat them as read-only and
+.copy() before adding or modifying columns.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines — fall back to in-process locking
+    fcntl = None
+
+import pandas as pd
+
+# ─── Paths ───
+DATA_DIR = Path(os.environ.get("SAFETY_DATA_DIR", Path(__file__).parent))
+STORE_DIR = DATA_DIR / "store"
+REPORTS_PATH = DATA_DIR / "base_reports.xlsx"
+ACTIONS_PATH = DATA_DIR / "actions.xlsx"
+JOURNAL_PATH = STORE_DIR / "journal.jsonl"
+COMPACTING_PATH = STORE_DIR / "journal.compacting.jsonl"
+SEQUENCE_PATH = STORE_DIR / "case_sequence"
+WRITE_LOCK_PATH = STORE_DIR / ".write.lock"
+COMPACT_LOCK_PATH = STORE_DIR / ".compact.lock"
+MANIFEST_PATH = STORE_DIR / "manifest.json"
+
+CASE_ID_FORMAT = "CASE-{:03d}"
+
+# Narrative fields that describe an incident (used for search and embeddings)
+TEXT_COLS = [
+    "title",
+    "what_happened",
+    "what_could_have_happened",
+    "why_did_it_happen",
+    "causal_factors",
+    "what_went_well",
+    "lessons_to_prevent",
+]
+
+# Fold the journal back into the workbooks once it grows past this size
+COMPACT_THRESHOLD_BYTES = 512 * 1024
+
+_lock = threading.Lock()
+_thread_locks = {}  # lock path -> threading.Lock, used when fcntl is unavailable
+_frames = {}  # source path -> (signature, DataFrame)
+_journals = {}  # journal path -> parse state, see _read_journal
+_merged = {}  # source path -> (key, DataFrame)
+
+
+# ─── Helpers ───
+def _signature(path: Path):
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def atomic_path(path: Path):
+    """
+    Temporary path to write path's new contents to; it replaces path when
+    the block exits cleanly, so readers never see a half-written file.
+
+    The temp file is unique per writer (so concurrent sessions and processes
+    never share one) and keeps path's suffix (np.save, np.savez and
+    to_excel go by it).
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp{path.suffix}")
+    try:
+        yield tmp
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    os.replace(tmp, path)
+
+
+def read_json(path: Path):
+    """Contents of a JSON file, or None if it is missing or unreadable."""
+    try:
+        return json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_json(path: Path, data) -> None:
+    """Write JSON atomically so readers never see a half-written file."""
+    with atomic_path(path) as tmp:
+        tmp.write_text(json.dumps(data))
+
+
+def _write_parquet(df: pd.DataFrame, path: Path) -> None:
+    with atomic_path(path) as tmp:
+        try:
+            df.to_parquet(tmp, index=False)
+        except (ValueError, TypeError):
+            # Hand-edited workbooks can mix ints and strings in one column,
+            # which Arrow refuses — store those columns as text instead.
+            mixed = df.copy()
+            for col in mixed.columns[mixed.dtypes == object]:
+                mixed[col] = mixed[col].where(mixed[col].isna(), mixed[col].astype(str))
+            mixed.to_parquet(tmp, index=False)
+
+
+def _write_workbook(df: pd.DataFrame, path: Path) -> None:
+    with atomic_path(path) as tmp:
+        df.to_excel(tmp, index=False)
+
+
+@contextmanager
+def _file_lock(path: Path, blocking: bool = True):
+    """
+    Exclusive lock shared by all threads and processes using this store.
+    Yields False instead of waiting if blocking=False and the lock is taken.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if fcntl is None:
+        lock = _thread_locks.setdefault(path, threading.Lock())
+        acquired = lock.acquire(blocking)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
+        return
+
+    # flock() is held per open file, so each caller opens its own handle
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _mirror_paths(source: Path):
+    return STORE_DIR / f"{source.stem}.parquet", STORE_DIR / f"{source.stem}.meta.json"
+
+
+def _save_mirror(source: Path, df: pd.DataFrame, digest=None) -> None:
+    mtime_ns, size = _signature(source)
+    parquet_path, meta_path = _mirror_paths(source)
+    _write_parquet(df, parquet_path)
+    write_json(meta_path, {
+        "mtime_ns": mtime_ns,
+        "size": size,
+        "sha256": digest or _file_hash(source),
+    })
+
+
+def _load_mirror(source: Path) -> pd.DataFrame:
+    """Return the workbook contents, rebuilding the Parquet mirror if stale."""
+    mtime_ns, size = _signature(source)
+    parquet_path, meta_path = _mirror_paths(source)
+    meta = read_json(meta_path)
+
+    digest = None
+    if meta and parquet_path.exists():
+        if (meta.get("mtime_ns"), meta.get("size")) == (mtime_ns, size):
+            return pd.read_parquet(parquet_path)
+        # mtime moved (copy, checkout, touch) — only rebuild if content changed
+        digest = _file_hash(source)
+        if meta.get("sha256") == digest:
+            write_json(meta_path, {"mtime_ns": mtime_ns, "size": size, "sha256": digest})
+            return pd.read_parquet(parquet_path)
+
+    df = pd.read_excel(source)
+    _save_mirror(source, df, digest)
+    return df
+
+
+def _load_source(source: Path):
+    """Workbook contents without journal records. Call with _lock held."""
+    if not source.exists():
+        return None
+    signature = _signature(source)
+    cached = _frames.get(source)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    df = _load_mirror(source)
+    _frames[source] = (signature, df)
+    return df
+
+
+# ─── Journal ───
+def _read_journal(path: Path):
+    """
+    Return (reports, actions) recorded in a journal file.
+    Only bytes appended since the previous call are parsed. Call with _lock held.
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        _journals.pop(path, None)
+        return [], []
+
+    with f:
+        stat = os.fstat(f.fileno())
+        size, ino = stat.st_size, stat.st_ino
+        # The first line identifies the file: each journal starts with the
+        # record of a freshly allocated case ID, so a journal rotated in by
+        # compact() differs there even if it reuses the old inode and has
+        # already grown past the old offset
+        generation = f.readline()
+        state = _journals.get(path)
+        if (state is None or state["ino"] != ino or state["generation"] != generation
+                or size < state["offset"]):
+            # New file, or the journal was rotated by compact()
+            state = {"ino": ino, "generation": generation, "offset": 0, "reports": [], "actions": []}
+            _journals[path] = state
+
+        chunk = b""
+        if size > state["offset"]:
+            f.seek(state["offset"])
+            chunk = f.read(size - state["offset"])
+    if chunk:
+        # Only consume complete lines; another writer may be mid-append
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            if line.strip():
+                record = json.loads(line)
+                state["reports"].append(record["report"])
+                state["actions"].extend(record.get("actions", []))
+        state["offset"] += end
+    return state["reports"], state["actions"]
+
+
+def _fold(base, rows):
+    """Overlay journal rows on a workbook frame (journal wins per case_id)."""
+    if not rows:
+        return base
+    extra = pd.DataFrame(rows)
+    if base is None:
+        return extra
+    for col in extra.columns.intersection(base.columns):
+        # Form input arrives as text (e.g. "2025" for date); keep numeric columns numeric
+        if pd.api.types.is_numeric_dtype(base[col]) and not pd.api.types.is_numeric_dtype(extra[col]):
+            extra[col] = pd.to_numeric(extra[col], errors="coerce")
+    # A crash between writing the workbook and deleting the compacted journal
+    # leaves the same case in both; the journal copy replaces the workbook one.
+    base = base[~base["case_id"].isin(extra["case_id"])]
+    return pd.concat([base, extra], ignore_index=True)
+
+
+def _load(source: Path):
+    with _lock:
+        base = _load_source(source)
+        rows = []
+        for path in (COMPACTING_PATH, JOURNAL_PATH):
+            reports, actions = _read_journal(path)
+            rows += reports if source == REPORTS_PATH else actions
+        key = (
+            _frames[source][0] if base is not None else None,
+            tuple((s["ino"], s["generation"], s["offset"]) for s in _journals.values()),
+        )
+        cached = _merged.get(source)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        df = _fold(base, rows)
+        _merged[source] = (key, df)
+        return df
+
+
+# ─── Public API ───
+def load_reports():
+    """Incident reports (workbook + journal) as a shared DataFrame, or None if there are none."""
+    return _load(REPORTS_PATH)
+
+
+def load_actions():
+    """Corrective actions (workbook + journal) as a shared DataFrame, or None if there are none."""
+    return _load(ACTIONS_PATH)
+
+
+def data_version():
+    """
+    Cheap token that changes whenever the underlying data changes.
+    Use it as a cache key for anything derived from load_reports()/load_actions().
+    """
+    return tuple(
+        _signature(p) if p.exists() else None
+        for p in (REPORTS_PATH, ACTIONS_PATH, COMPACTING_PATH, JOURNAL_PATH)
+    )
+
+
+def data_watermark():
+    """
+    data_version() in the form it takes once stored as JSON (lists, not
+    tuples), to compare with a watermark saved by write_json().
+    """
+    return json.loads(json.dumps(data_version()))
+
+
+# ─── Manifest ───
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _schema(report_cols, action_cols) -> dict:
+    columns = {"reports": list(report_cols), "actions": list(action_cols)}
+    fingerprint = hashlib.sha1(json.dumps(columns).encode()).hexdigest()[:12]
+    return {"columns": columns, "fingerprint": fingerprint}
+
+
+def _rebuild_manifest() -> dict:
+    """Recompute the manifest from the data. Call with the write lock held."""
+    reports = load_reports()
+    actions = load_actions()
+    if reports is not None and "location" in reports.columns:
+        locations = reports["location"].dropna().astype(str)
+        locations = locations[locations != ""].value_counts().to_dict()
+    else:
+        locations = {}
+    manifest = {
+        "incidents": 0 if reports is None else len(reports),
+        "actions": 0 if actions is None else len(actions),
+        "locations": {k: int(v) for k, v in locations.items()},
+        "last_modified": _now(),
+        "schema": _schema(
+            [] if reports is None else reports.columns,
+            [] if actions is None else actions.columns,
+        ),
+        "version": data_version(),
+    }
+    write_json(MANIFEST_PATH, manifest)
+    return manifest
+
+
+def _record_write(report: dict, actions: list, watermark) -> None:
+    """
+    Fold one submission into the manifest. Call with the write lock held.
+
+    watermark is data_watermark() from just before the submission was
+    appended; a manifest that wasn't current then (e.g. a workbook was
+    replaced by hand) is rebuilt rather than stamped current.
+    """
+    manifest = read_json(MANIFEST_PATH)
+    if manifest is None or manifest.get("version") != watermark:
+        _rebuild_manifest()
+        return
+    manifest["incidents"] += 1
+    manifest["actions"] += len(actions)
+    # Same rule as _rebuild_manifest: missing and blank locations aren't
+    # counted (a blank cell reads back as missing once compacted anyway)
+    location = report.get("location")
+    if location is not None and not pd.isna(location) and str(location) != "":
+        location = str(location)
+        manifest["locations"][location] = manifest["locations"].get(location, 0) + 1
+    columns = manifest["schema"]["columns"]
+    new_report_cols = [c for c in report if c not in columns["reports"]]
+    new_action_cols = [c for a in actions for c in a if c not in columns["actions"]]
+    if new_report_cols or new_action_cols:
+        manifest["schema"] = _schema(
+            columns["reports"] + new_report_cols,
+            columns["actions"] + list(dict.fromkeys(new_action_cols)),
+        )
+    manifest["last_modified"] = _now()
+    manifest["version"] = data_version()
+    write_json(MANIFEST_PATH, manifest)
+
+
+def _stamp_manifest() -> None:
+    """Mark the manifest current after files moved without content changing."""
+    manifest = read_json(MANIFEST_PATH)
+    if manifest is not None:
+        manifest["version"] = data_version()
+        write_json(MANIFEST_PATH, manifest)
+
+
+def read_manifest() -> dict:
+    """
+    Dataset summary: incidents, actions, locations ({name: count}),
+    last_modified (ISO-8601 UTC) and schema ({columns, fingerprint}).
+
+    Costs one small JSON read. The manifest is only rebuilt from the data if it
+    is missing or the files changed behind the store's back (e.g. a workbook
+    was replaced by hand).
+    """
+    manifest = read_json(MANIFEST_PATH)
+    if manifest is not None and manifest.get("version") == data_watermark():
+        return manifest
+    with _file_lock(WRITE_LOCK_PATH):
+        return _rebuild_manifest()
+
+
+def _case_number(case_id) -> int:
+    match = re.search(r"(\d+)", str(case_id))
+    return int(match.group(1)) if match else 0
+
+
+def _last_case_number() -> int:
+    """Last allocated case number, seeded once from the data if there is no sequence yet."""
+    try:
+        return int(SEQUENCE_PATH.read_text())
+    except (FileNotFoundError, ValueError):
+        reports = load_reports()
+        if reports is None or reports.empty:
+            return 0
+        return max(_case_number(c) for c in reports["case_id"])
+
+
+def _write_sequence(number: int) -> None:
+    with atomic_path(SEQUENCE_PATH) as tmp:
+        with open(tmp, "w") as f:
+            f.write(str(number))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def peek_next_case_id() -> str:
+    """
+    The ID the next submission will probably get, for display only.
+    The real ID is assigned atomically by submit_incident().
+    """
+    return CASE_ID_FORMAT.format(_last_case_number() + 1)
+
+
+def submit_incident(report: dict, actions=()) -> str:
+    """
+    Allocate a case ID and record the incident and its actions under it.
+
+    ID allocation and the journal append happen under one store-wide lock, so
+    concurrent submissions get distinct IDs and none can overwrite another.
+    The append is O(1) — the workbooks are not touched until compact() runs,
+    which happens in the background once the journal passes
+    COMPACT_THRESHOLD_BYTES.
+
+    Returns:
+        The allocated case ID, e.g. "CASE-197".
+    """
+    with _file_lock(WRITE_LOCK_PATH):
+        number = _last_case_number() + 1
+        _write_sequence(number)
+        case_id = CASE_ID_FORMAT.format(number)
+
+        report = {"case_id": case_id, **report}
+        actions = [{"case_id": case_id, **a} for a in actions]
+        record = json.dumps({"report": report, "actions": actions}, default=str) + "\n"
+        watermark = data_watermark()
+        fd = os.open(JOURNAL_PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, record.encode("utf-8"))
+            os.fsync(fd)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        _record_write(report, actions, watermark)
+
+    if size >= COMPACT_THRESHOLD_BYTES:
+        threading.Thread(target=compact, daemon=True).start()
+    return case_id
+
+
+def compact() -> bool:
+    """
+    Fold journaled submissions into base_reports.xlsx / actions.xlsx.
+
+    The journal is first renamed aside, so submissions arriving while the
+    workbooks are rewritten go to a fresh journal and are never lost. A
+    compaction left half-done by a crash is finished on the next call.
+    Returns True if anything was compacted.
+    """
+    with _file_lock(COMPACT_LOCK_PATH, blocking=False) as acquired:
+        if not acquired:
+            return False  # another session or process is already compacting
+        if not COMPACTING_PATH.exists():
+            # Rotate under the write lock so no append can land in the old file
+            with _file_lock(WRITE_LOCK_PATH):
+                if not JOURNAL_PATH.exists():
+                    return False
+                os.replace(JOURNAL_PATH, COMPACTING_PATH)
+                _stamp_manifest()
+
+        with _lock:
+            reports_rows, actions_rows = (list(rows) for rows in _read_journal(COMPACTING_PATH))
+            reports = _fold(_load_source(REPORTS_PATH), reports_rows)
+            actions = _fold(_load_source(ACTIONS_PATH), actions_rows)
+
+        for source, df in ((REPORTS_PATH, reports), (ACTIONS_PATH, actions)):
+            if df is None:
+                continue
+            _write_workbook(df, source)
+            # Refresh the mirror directly so readers don't re-parse the workbook
+            _save_mirror(source, df)
+
+        with _file_lock(WRITE_LOCK_PATH):
+            COMPACTING_PATH.unlink()
+            _stamp_manifest()
+        return True
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Incident store maintenance")
+    parser.add_argument("command", choices=["compact"])
+    args = parser.parse_args()
+    if args.command == "compact":
+        print("Compacted journal." if compact() else "Nothing to compact.")
@@ -0,0 +1,173 @@
+"""
+Canonical per-incident embedding store.
+
+Every incident is embedded once, from one text recipe (incident_text()), and
+kept in store/incident_vectors.npy as a single contiguous float32 matrix,
+with store/incident_vectors.json listing the case_id and text hash of each
+row. The Chroma indexer and the clustering page both read vectors from here
+in bulk, so an incident that has been seen before costs no embedding call
+(and no cache lookup) anywhere.
+
+sync_vectors() follows the incident store: when its data_version() moves, it
+re-hashes the incident texts and embeds only new or changed incidents
+(through embed(), so concurrently, rate-limited and cached). A store that
+doesn't exist yet starts from the vectors the Chroma collection already
+holds for the same text, so the first run doesn't re-embed the corpus.
+"""
+
+import hashlib
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from clients import EMBEDDING_MODEL
+from embedding_cache import BATCH_SIZE, CONCURRENCY, DIMENSIONALITY, embed
+from incident_store import STORE_DIR, atomic_path, data_watermark, load_reports, read_json, write_json
+from text_prep import embedding_text
+
+logger = logging.getLogger(__name__)
+
+# ─── Configuration ───
+VECTORS_PATH = STORE_DIR / "incident_vectors.npy"
+INDEX_PATH = STORE_DIR / "incident_vectors.json"
+
+_lock = threading.Lock()
+_loaded = {"index": None, "matrix": None, "position": None}
+
+
+def incident_text(reports: pd.DataFrame) -> pd.Series:
+    """The one text each incident is embedded (and indexed in Chroma) under."""
+    return embedding_text(reports)
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _read_index():
+    index = read_json(INDEX_PATH)
+    try:
+        matrix = np.load(VECTORS_PATH)
+    except (FileNotFoundError, ValueError):
+        return None, None
+    if index is None:
+        return None, None
+    if (index.get("model"), index.get("dimensionality")) != (EMBEDDING_MODEL, DIMENSIONALITY) \
+            or matrix.shape != (len(index["ids"]), DIMENSIONALITY):
+        return None, None
+    return index, matrix
+
+
+def _write(index, matrix) -> None:
+    with atomic_path(VECTORS_PATH) as tmp:
+        np.save(tmp, matrix)
+    write_json(INDEX_PATH, index)
+
+
+def _collection_vectors(ids, hashes):
+    """
+    Vectors the Chroma collection holds for these incidents, where its
+    document is still the incident's text.
+
+    Returns:
+        (matrix, rows): rows[i] is the row of matrix holding ids[i]'s vector,
+        or -1 if there is none to reuse.
+    """
+    rows = np.full(len(ids), -1)
+    try:
+        from clients import get_collection
+        existing = get_collection().get(ids=ids, include=["embeddings", "documents"])
+    except Exception:
+        logger.warning("Could not read vectors from the Chroma collection", exc_info=True)
+        return None, rows
+    matrix = np.asarray(existing["embeddings"], dtype=np.float32)
+    if not len(existing["ids"]) or matrix.shape != (len(existing["ids"]), DIMENSIONALITY):
+        return None, rows
+    found = {
+        case_id: (i, _text_hash(document or ""))
+        for i, (case_id, document) in enumerate(zip(existing["ids"], existing["documents"]))
+    }
+    for row, (case_id, h) in enumerate(zip(ids, hashes)):
+        i, found_hash = found.get(case_id, (-1, None))
+        if found_hash == h:
+            rows[row] = i
+    return matrix, rows
+
+
+def _remember(index, matrix) -> None:
+    _loaded.update({
+        "index": index,
+        "matrix": matrix,
+        "position": {case_id: i for i, case_id in enumerate(index["ids"])},
+    })
+
+
+def sync_vectors(force=False) -> dict:
+    """
+    Make sure every incident in the store has an up-to-date vector.
+
+    Returns:
+        dict with embedded (vectors computed now) and total counts.
+    """
+    with _lock:
+        watermark = data_watermark()
+        index, matrix = (_loaded["index"], _loaded["matrix"])
+        if index is None:
+            index, matrix = _read_index()
+        if index is not None and index["watermark"] == watermark and not force:
+            if _loaded["index"] is not index:
+                _remember(index, matrix)
+            return {"embedded": 0, "total": len(index["ids"])}
+
+        reports = load_reports()
+        if reports is None:
+            reports = pd.DataFrame(columns=["case_id"])
+        ids = reports["case_id"].astype(str).tolist()
+        texts = incident_text(reports).tolist()
+        hashes = [_text_hash(t) for t in texts]
+
+        old_rows = np.full(len(ids), -1)
+        if index is not None:
+            old = {case_id: (i, h) for i, (case_id, h) in enumerate(zip(index["ids"], index["hashes"]))}
+            for row, (case_id, h) in enumerate(zip(ids, hashes)):
+                i, old_hash = old.get(case_id, (-1, None))
+                if old_hash == h:
+                    old_rows[row] = i
+        elif ids:
+            matrix, old_rows = _collection_vectors(ids, hashes)
+
+        new_matrix = np.empty((len(ids), DIMENSIONALITY), dtype=np.float32)
+        reused = old_rows >= 0
+        if reused.any():
+            new_matrix[reused] = matrix[old_rows[reused]]
+        need = np.flatnonzero(~reused)
+        if len(need):
+            new_matrix[need] = embed([texts[i] for i in need], batch_size=BATCH_SIZE,
+                                     concurrency=CONCURRENCY)
+
+        index = {
+            "model": EMBEDDING_MODEL,
+            "dimensionality": DIMENSIONALITY,
+            "watermark": watermark,
+            "ids": ids,
+            "hashes": hashes,
+        }
+        _write(index, new_matrix)
+        _remember(index, new_matrix)
+        return {"embedded": len(need), "total": len(ids)}
+
+
+def load_vectors():
+    """(case_ids, float32 matrix) for every incident in the store, rows aligned."""
+    sync_vectors()
+    return list(_loaded["index"]["ids"]), _loaded["matrix"]
+
+
+def vectors_for(case_ids) -> np.ndarray:
+    """Contiguous float32 matrix with one row per case_id, in the given order."""
+    sync_vectors()
+    position = _loaded["position"]
+    rows = [position[str(case_id)] for case_id in case_ids]
+    return np.ascontiguousarray(_loaded["matrix"][rows])
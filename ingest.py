@@ -0,0 +1,187 @@
+"""
+Bulk ingestion of incident reports into the safety_incidents collection.
+
+Built for large backfills (tens of thousands of rows) where the notebook's
+row-at-a-time collection.add is too slow:
+
+    - rows are processed in chunks of --chunk-size; within a chunk, embedding
+      batches of --batch-size run --concurrency at a time (through the shared
+      embedding cache, so re-runs only pay for unseen text)
+    - each chunk is written with one collection.upsert call
+    - after every chunk a checkpoint is written, so a crashed run resumes at
+      the first unwritten chunk (upsert makes a re-written chunk harmless)
+    - a throughput report (rows/s, embed and write latency) is printed at the end
+
+For day-to-day submissions incident_index.sync_index() is enough; this is for
+rebuilding or backfilling the collection.
+
+USAGE:
+    python ingest.py                         # everything in the incident store
+    python ingest.py --source old_years.xlsx # a workbook / parquet / csv export
+    python ingest.py --restart               # ignore the checkpoint
+"""
+
+import argparse
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from clients import COLLECTION_NAME
+from embedding_cache import embed
+from incident_index import bump_version, incident_metadata, reset_state
+from incident_vectors import incident_text
+from incident_store import STORE_DIR, load_reports, read_json, write_json
+
+# ─── Configuration ───
+CHECKPOINT_PATH = STORE_DIR / "ingest_checkpoint.json"
+CHUNK_SIZE = 1000  # rows per collection.upsert
+BATCH_SIZE = 50  # texts per embedding call
+CONCURRENCY = 4  # embedding calls in flight
+
+
+def _read_source(source):
+    if source is None:
+        reports = load_reports()
+        return reports if reports is not None else pd.DataFrame(columns=["case_id"])
+    if source.endswith(".parquet"):
+        return pd.read_parquet(source)
+    if source.endswith(".csv"):
+        return pd.read_csv(source)
+    return pd.read_excel(source)
+
+
+def _fingerprint(ids, documents) -> str:
+    """Identifies the input, so a checkpoint is only resumed against the same rows."""
+    digest = hashlib.sha1()
+    for case_id, document in zip(ids, documents):
+        digest.update(f"{case_id}\0{document}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _timed_embed(texts, batch_size):
+    start = time.perf_counter()
+    vectors = embed(texts, batch_size=batch_size)
+    return vectors, time.perf_counter() - start
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def ingest(reports, collection=None, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE,
+           concurrency=CONCURRENCY, restart=False, progress=print):
+    """
+    Embed and upsert reports into the collection, resuming from the checkpoint.
+
+    Args:
+        reports: DataFrame with case_id, the narrative columns and metadata columns.
+        collection: Chroma collection (default: the app's safety_incidents).
+        chunk_size: Rows per upsert and per checkpoint.
+        batch_size: Texts per embedding call.
+        concurrency: Embedding calls in flight at once.
+        restart: Ignore any existing checkpoint.
+        progress: Called with a status line after each chunk (None to silence).
+
+    Returns:
+        Throughput report dict: rows, resumed_from, seconds, rows_per_second,
+        embed_batches, embed_latency_mean/p95, write_chunks, write_latency_mean/p95.
+    """
+    if collection is None:
+        from clients import get_collection
+        collection = get_collection(COLLECTION_NAME)
+
+    ids = reports["case_id"].astype(str).tolist()
+    documents = incident_text(reports).tolist()
+    metadatas = incident_metadata(reports)
+    fingerprint = _fingerprint(ids, documents)
+
+    checkpoint = None if restart else read_json(CHECKPOINT_PATH)
+    done = 0
+    if checkpoint and checkpoint.get("fingerprint") == fingerprint:
+        done = checkpoint["rows_done"]
+    resumed_from = done
+
+    embed_latencies, write_latencies = [], []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while done < len(ids):
+            end = min(done + chunk_size, len(ids))
+            texts = documents[done:end]
+            batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+            results = list(pool.map(lambda batch: _timed_embed(batch, batch_size), batches))
+            embed_latencies.extend(latency for _, latency in results)
+            embeddings = np.concatenate([vectors for vectors, _ in results])
+
+            write_start = time.perf_counter()
+            collection.upsert(
+                ids=ids[done:end],
+                documents=texts,
+                metadatas=[m or None for m in metadatas[done:end]],
+                embeddings=embeddings.tolist(),
+            )
+            write_latencies.append(time.perf_counter() - write_start)
+
+            done = end
+            write_json(CHECKPOINT_PATH, {"fingerprint": fingerprint, "rows_done": done, "total": len(ids)})
+            if progress:
+                elapsed = time.perf_counter() - start
+                progress(f"{done:,}/{len(ids):,} rows · {(done - resumed_from) / elapsed:,.0f} rows/s")
+
+    seconds = time.perf_counter() - start
+    if done > resumed_from:
+        bump_version(collection)
+        reset_state()  # the incremental indexer re-seeds from the collection
+
+    ingested = done - resumed_from
+    return {
+        "rows": ingested,
+        "resumed_from": resumed_from,
+        "seconds": seconds,
+        "rows_per_second": ingested / seconds if seconds else 0.0,
+        "embed_batches": len(embed_latencies),
+        "embed_latency_mean": float(np.mean(embed_latencies)) if embed_latencies else 0.0,
+        "embed_latency_p95": _percentile(embed_latencies, 95),
+        "write_chunks": len(write_latencies),
+        "write_latency_mean": float(np.mean(write_latencies)) if write_latencies else 0.0,
+        "write_latency_p95": _percentile(write_latencies, 95),
+    }
+
+
+def format_report(report) -> str:
+    lines = [
+        f"Ingested {report['rows']:,} rows in {report['seconds']:.1f}s "
+        f"({report['rows_per_second']:,.1f} rows/s)",
+        f"  embed: {report['embed_batches']} batches · mean {report['embed_latency_mean'] * 1000:,.0f} ms"
+        f" · p95 {report['embed_latency_p95'] * 1000:,.0f} ms",
+        f"  write: {report['write_chunks']} chunks · mean {report['write_latency_mean'] * 1000:,.0f} ms"
+        f" · p95 {report['write_latency_p95'] * 1000:,.0f} ms",
+    ]
+    if report["resumed_from"]:
+        lines.insert(1, f"  resumed after {report['resumed_from']:,} rows from the checkpoint")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest incident reports into Chroma")
+    parser.add_argument("--source", help="Workbook/parquet/csv to ingest (default: the incident store)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per upsert/checkpoint")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Texts per embedding call")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Embedding calls in flight")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+    args = parser.parse_args()
+
+    report = ingest(
+        _read_source(args.source),
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        restart=args.restart,
+    )
+    print(format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,15 +5,16 @@ import streamlit as st
 import sys
 from pathlib import Path
 
-
-from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
-
-import matplotlib.pyplot as plt
-import matplotlib.ticker as mticker
+# scikit-learn and matplotlib are imported where they are first needed —
+# neither is used until the user starts clustering.
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
+from incident_store import REPORTS_PATH, ACTIONS_PATH, TEXT_COLS, load_reports, load_actions
+import cluster_model
+from cluster_themes import generate_cluster_themes
+from incident_vectors import vectors_for
+from text_prep import clean, display_text
 
 # ─── Styling ───
 st.markdown("""
@@ -55,110 +56,83 @@ st.markdown("""
 PROJECT_ID = "methanex-safety"
 REGION = "us-central1"
 
-DATA_DIR = Path(__file__).parent.parent
-REPORTS_PATH = DATA_DIR / "base_reports.xlsx"
-ACTIONS_PATH = DATA_DIR / "actions.xlsx"
-
-TEXT_COLS = [
-    "title",
-    "what_happened",
-    "what_could_have_happened",
-    "why_did_it_happen",
-    "causal_factors",
-    "what_went_well",
-    "lessons_to_prevent",
-]
-
 BASE_REQUIRED_COLS = set(["case_id", "risk_level", "severity"]).union(TEXT_COLS)
 ACTIONS_REQUIRED_COLS = set(["case_id", "action", "owner", "timing", "verification"])
 
 K_CANDIDATES = [3, 4, 5, 6]
+DEFAULT_K = 4
 DEFAULT_TIE_EPS = 0.01
-RANDOM_STATE = 42
 
+# Action timing buckets: the first rule whose phrases appear in the
+# (lower-cased) timing text wins; anything else is "Other"
+TIMING_RULES = [
+    ("Immediate", ["immediate", "right away", "asap"]),
+    ("Long-Term", [">90", "over 90", "90+"]),
+    ("Short-Term", ["<30", "0-30", "30 days", "< 30", "30-60", "60 days", "60-90", "90 days"]),
+]
+TIMING_LABELS = ["Immediate", "Short-Term", "Long-Term", "Other", "Unspecified"]
+SAMPLE_CASES = 20
+SAMPLE_COLS = ["case_id", "title", "risk_level", "severity"]
 
-# ─── Helpers ───
-def clean_text(x) -> str:
-    if pd.isna(x):
-        return ""
-    x = str(x).replace("\n", " ").replace("\r", " ")
-    x = re.sub(r"\s+", " ", x).strip()
-    return x
-
-@st.cache_data
-def load_data():
-    if not REPORTS_PATH.exists():
-        return None
-    df = pd.read_excel(REPORTS_PATH)
-    # Ensure text cols exist
-    for col in TEXT_COLS:
-        if col not in df.columns:
-            df[col] = ""
-    # Combine text for embedding
-    df["combined_text"] = df[TEXT_COLS].fillna("").agg(" ".join, axis=1)
-    return df.copy()
 
+# ─── Helpers ───
 def build_incident_text(df: pd.DataFrame) -> pd.DataFrame:
     missing = [c for c in TEXT_COLS if c not in df.columns]
     if missing:
         raise ValueError(f"base_reports is missing required text columns: {missing}")
     df = df.copy()
-    df["incident_text"] = df[TEXT_COLS].apply(
-        lambda r: " | ".join([clean_text(v) for v in r.values if clean_text(v)]),
-        axis=1
-    )
+    df["incident_text"] = display_text(df)
     return df
 
 
-def normalize_timing(x: object) -> str:
-    if pd.isna(x):
-        return "Unspecified"
-    s = str(x).strip().lower()
-    if "immediate" in s or "right away" in s or "asap" in s:
-        return "Immediate"
-    if ">90" in s or "over 90" in s or "90+" in s:
-        return "Long-Term"
-    if "<30" in s or "0-30" in s or "30 days" in s or "< 30" in s:
-        return "Short-Term"
-    if "30-60" in s or "60 days" in s:
-        return "Short-Term"
-    if "60-90" in s or "90 days" in s:
-        return "Short-Term"
-    return "Other"
-
-
-def pick_best_k_by_silhouette(embeddings: np.ndarray, eps: float):
-    scores = {}
-    for k in K_CANDIDATES:
-        km = KMeans(n_clusters=k, random_state=RANDOM_STATE, n_init="auto")
-        labels = km.fit_predict(embeddings)
-        scores[k] = float(silhouette_score(embeddings, labels))
+def normalize_timing(timing: pd.Series) -> pd.Series:
+    """Timing text bucketed into TIMING_LABELS, as a categorical column."""
+    text = timing.fillna("").astype(str).str.strip().str.lower()
+    matches = [
+        text.str.contains("|".join(map(re.escape, phrases)), regex=True).to_numpy()
+        for _, phrases in TIMING_RULES
+    ]
+    labels = np.select(matches, [label for label, _ in TIMING_RULES], default="Other")
+    labels = np.where(timing.isna().to_numpy(), "Unspecified", labels)
+    return pd.Series(pd.Categorical(labels, categories=TIMING_LABELS), index=timing.index)
+
+
+def normalize_actions(actions_df: pd.DataFrame) -> pd.DataFrame:
+    """Actions with timing_clean and a whitespace-normalized owner, both categorical."""
+    return actions_df.assign(
+        timing_clean=normalize_timing(actions_df["timing"]),
+        owner=clean(actions_df["owner"].fillna("Unspecified")).astype("category"),
+    )
+
+
+def pick_best_k(scores: dict, eps: float = DEFAULT_TIE_EPS):
+    """Highest-silhouette k, preferring DEFAULT_K when it is within eps of the best."""
+    scores = {k: v for k, v in scores.items() if v is not None}
+    if not scores:
+        return DEFAULT_K
     best_k = max(scores, key=scores.get)
-    if 4 in scores and (scores[best_k] - scores[4] <= eps):
-        chosen = 4
-    else:
-        chosen = best_k
-    return chosen, scores
+    if DEFAULT_K in scores and (scores[best_k] - scores[DEFAULT_K] <= eps):
+        return DEFAULT_K
+    return best_k
 
 
-def compute_cluster_matrix(base_df, actions_df, cluster_col="cluster_id"):
-    risk_dist = base_df.groupby([cluster_col, "risk_level"]).size().unstack(fill_value=0)
-    risk_pct = (risk_dist.div(risk_dist.sum(axis=1), axis=0) * 100).round(1)
-    high_risk = risk_pct.get("High", pd.Series(0, index=risk_pct.index))
+def _share(values: pd.Series, clusters: pd.Series, label) -> pd.Series:
+    """Percentage of each cluster's (non-missing) values equal to label."""
+    known = values.notna()
+    return values[known].eq(label).groupby(clusters[known]).mean() * 100
 
-    sev_dist = base_df.groupby([cluster_col, "severity"]).size().unstack(fill_value=0)
-    sev_pct = (sev_dist.div(sev_dist.sum(axis=1), axis=0) * 100).round(1)
-    major = sev_pct.get("Major", pd.Series(0, index=sev_pct.index))
-    serious = sev_pct.get("Serious", pd.Series(0, index=sev_pct.index))
-    high_sev = (major + serious).fillna(0)
 
-    a = actions_df.copy()
-    a["timing_clean"] = a["timing"].apply(normalize_timing)
-    timing_dist = a.groupby([cluster_col, "timing_clean"]).size().unstack(fill_value=0)
-    timing_pct = (timing_dist.div(timing_dist.sum(axis=1), axis=0) * 100).fillna(0)
-    reactivity = timing_pct.get("Immediate", pd.Series(0, index=timing_pct.index))
+def compute_cluster_matrix(base_df, actions_df, cluster_col="cluster_id"):
+    """One row per cluster: size, High risk %, Major + Serious %, and % Immediate actions."""
+    clusters = base_df[cluster_col]
+    high_risk = _share(base_df["risk_level"], clusters, "High").round(1)
+    high_sev = (
+        _share(base_df["severity"], clusters, "Major").round(1)
+        + _share(base_df["severity"], clusters, "Serious").round(1)
+    )
+    reactivity = _share(actions_df["timing_clean"], actions_df[cluster_col], "Immediate")
 
-    n_cases = base_df.groupby(cluster_col).size()
+    n_cases = clusters.value_counts().sort_index()
 
     out = pd.DataFrame({
         "cluster_id": n_cases.index.astype(int),
@@ -171,87 +145,16 @@ def compute_cluster_matrix(base_df, actions_df, cluster_col="cluster_id"):
 
 
 def top_action_owners(actions_df, cluster_col="cluster_id", top_n=5):
-    a = actions_df.copy()
-    a["owner"] = (
-        a["owner"].fillna("Unspecified").astype(str)
-        .str.replace(r"\s+", " ", regex=True).str.strip()
-    )
+    """{cluster id: DataFrame of its top_n owners and n_actions, smallest first}."""
     counts = (
-        a.groupby([cluster_col, "owner"]).size()
-        .reset_index(name="n_actions")
-        .sort_values([cluster_col, "n_actions"], ascending=[True, False])
+        actions_df.groupby(cluster_col)["owner"].value_counts()
+        .rename("n_actions").reset_index()
     )
-    return counts.groupby(cluster_col).head(top_n)
-
-
-# ─── Vertex AI Embeddings ───
-@st.cache_data(show_spinner=False)
-def embed_with_vertex_ai(texts, project_id, region, model="text-embedding-004", batch_size=16):
-    from google import genai
-    client = genai.Client(vertexai=True, project=project_id, location=region)
-    vectors = []
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i + batch_size]
-        resp = client.models.embed_content(model=model, contents=batch)
-        vectors.extend([e.values for e in resp.embeddings])
-    return np.array(vectors, dtype=np.float32)
-
-
-@st.cache_data(show_spinner=False)
-def generate_cluster_themes(df: pd.DataFrame, cluster_col: str, text_col: str, project_id: str, region: str):
-    from google import genai
-    import json
-    client = genai.Client(vertexai=True, project=project_id, location=region)
-    
-    themes = {}
-    clusters = sorted(df[cluster_col].unique())
-    
-    for cid in clusters:
-        # Sample up to 15 incidents for better context
-        sample_texts = df[df[cluster_col] == cid][text_col].sample(n=min(15, len(df)), random_state=42).tolist()
-        text_blob = "\n- ".join(sample_texts)
-        
-        prompt = f"""
-        You are a senior safety analyst. Below are incident descriptions from a specific cluster.
-        Analyze them to identify the root cause pattern and key risks.
-
-        Incidents:
-        {text_blob}
-        
-        Task: Return a JSON object with:
-        1. "title": A short, specific title (3-6 words).
-        2. "summary": A list of exactly 3 short bullet points summarizing the key risk, common cause, and a recommended focus area.
-
-        Example Output:
-        {{
-            "title": "Contractor LOTO Violations",
-            "summary": [
-                "High frequency of Lockout/Tagout violations during contractor shift changes.",
-                "Root causes often involve unclear verbal communication of isolation points.",
-                "Focus on digital verification and localized supervision for contractors."
-            ]
-        }}
-        Return ONLY valid JSON.
-        """
-        
-        try:
-            # Try 2.0-flash which is used in safety_bot.py
-            response = client.models.generate_content(
-                model="gemini-2.0-flash", 
-                contents=prompt,
-                config={'response_mime_type': 'application/json'}
-            )
-            data = json.loads(response.text)
-            themes[cid] = data
-        except Exception as e:
-            # Show the actual error in the UI for debugging
-            themes[cid] = {
-                "title": f"Error: {str(e)[:50]}...",
-                "summary": ["Could not generate summary due to an error."]
-            }
-            print(f"Error generating theme for cluster {cid}: {e}")
-            
-    return themes
+    counts = counts[counts["n_actions"] > 0].groupby(cluster_col).head(top_n)
+    return {
+        int(cid): group[["owner", "n_actions"]].iloc[::-1].astype({"owner": str})
+        for cid, group in counts.groupby(cluster_col)
+    }
 
 
 # ─── Load Data ───
@@ -262,8 +165,8 @@ if not ACTIONS_PATH.exists():
     st.error(f"❌ `{ACTIONS_PATH.name}` not found in the project directory.")
     st.stop()
 
-base = pd.read_excel(REPORTS_PATH)
-actions = pd.read_excel(ACTIONS_PATH)
+base = load_reports()
+actions = load_actions()
 
 missing_base = [c for c in BASE_REQUIRED_COLS if c not in base.columns]
 missing_actions = [c for c in ACTIONS_REQUIRED_COLS if c not in actions.columns]
@@ -276,8 +179,6 @@ if missing_actions:
     st.stop()
 
 # ─── Run Clustering ───
-FIXED_K = 4
-
 st.markdown("Click **Start Clustering** to begin. The AI will analyze incident narratives and automatically identify key risk patterns.")
 run = st.button("🚀 Start Clustering", type="primary", use_container_width=True)
 
@@ -286,49 +187,95 @@ if not run and "clustering_done" not in st.session_state:
 
 if run:
     base_processed = build_incident_text(base)
-
-    with st.spinner("Creating embeddings with Vertex AI..."):
-        embeddings = embed_with_vertex_ai(
-            texts=base_processed["incident_text"].fillna("").astype(str).tolist(),
-            project_id=PROJECT_ID,
-            region=REGION,
+    actions = normalize_actions(actions)
+
+    with st.spinner("Loading incident embeddings..."):
+        # One stored vector per incident, shared with SafeBot's index: only
+        # incidents never seen before are sent to Vertex AI
+        embeddings = vectors_for(base_processed["case_id"])
+
+    with st.spinner(f"Clustering incidents (k = {', '.join(map(str, K_CANDIDATES))})..."):
+        # All candidate k at once; saved models are reused (new incidents go to
+        # the nearest centroid) and only drifted ones are refit, in parallel
+        sweep = cluster_model.sweep(
+            base_processed["case_id"].astype(str).tolist(), embeddings, K_CANDIDATES
         )
 
-    with st.spinner("Clustering incidents (k=4)..."):
-        km = KMeans(n_clusters=FIXED_K, random_state=RANDOM_STATE, n_init="auto")
-        base_processed["cluster_id"] = km.fit_predict(embeddings).astype(int)
-
-    with st.spinner("Analyzing cluster themes with Gemini..."):
-        themes = generate_cluster_themes(
-            base_processed, "cluster_id", "incident_text", PROJECT_ID, REGION
-        )
-
-    actions_merged = actions.merge(
-        base_processed[["case_id", "cluster_id"]], on="case_id", how="left"
-    )
+    # Everything local shown for a k is computed here once, so switching k is
+    # instant; Gemini themes are generated only for the k being viewed (below)
+    clusterings = {}
+    for k, (labels, model, model_info) in sweep.items():
+        base_k = base_processed.assign(cluster_id=labels.astype(int))
+        actions_k = actions.merge(base_k[["case_id", "cluster_id"]], on="case_id", how="left")
+        matched = actions_k.dropna(subset=["cluster_id"])
+        clusterings[k] = {
+            "clusters": sorted(base_k["cluster_id"].unique()),
+            "labels": labels.astype(int),
+            "samples": {
+                int(cid): group.head(SAMPLE_CASES)
+                for cid, group in base_k[[c for c in SAMPLE_COLS if c in base_k.columns]]
+                .groupby(base_k["cluster_id"])
+            },
+            "unmatched_actions": int(actions_k["cluster_id"].isna().sum()),
+            "themes": None,
+            "matrix": compute_cluster_matrix(base_k, matched, cluster_col="cluster_id"),
+            "owners": top_action_owners(matched, cluster_col="cluster_id", top_n=5),
+            "silhouette": model["silhouette"],
+            "info": {**model_info, "version": model["version"]},
+        }
 
     st.session_state["clustering_done"] = True
-    st.session_state["base_clustered"] = base_processed
-    st.session_state["actions_clustered"] = actions_merged
-    st.session_state["cluster_themes"] = themes
+    st.session_state["clustering_texts"] = base_processed[["case_id", "incident_text"]]
+    st.session_state["clusterings"] = clusterings
+    st.session_state["cluster_k"] = pick_best_k({k: c["silhouette"] for k, c in clusterings.items()})
     st.rerun()
 
 # ─── Display Results ───
 if "clustering_done" in st.session_state:
-    base_processed = st.session_state["base_clustered"]
-    actions_merged = st.session_state["actions_clustered"]
-    themes = st.session_state.get("cluster_themes", {})
-
-    st.success(f"✅ Clustering complete — **{FIXED_K} clusters** identified")
-
-    missing_clusters = int(actions_merged["cluster_id"].isna().sum())
+    import matplotlib.pyplot as plt
+    import matplotlib.ticker as mticker
+
+    clusterings = st.session_state["clusterings"]
+    silhouettes = {k: c["silhouette"] for k, c in clusterings.items()}
+
+    selected_k = st.radio(
+        "Number of clusters (k):",
+        options=list(clusterings),
+        format_func=lambda k: f"k = {k}" if silhouettes[k] is None else f"k = {k} (silhouette {silhouettes[k]:.3f})",
+        horizontal=True,
+        key="cluster_k",
+    )
+    clustering = clusterings[selected_k]
+    if clustering["themes"] is None:
+        # Themes are persisted per cluster membership (cluster_themes.py), so
+        # coming back to a k, or re-running unchanged, costs no Gemini call
+        with st.spinner("Analyzing cluster themes with Gemini..."):
+            texts = st.session_state["clustering_texts"].assign(cluster_id=clustering["labels"])
+            clustering["themes"] = generate_cluster_themes(
+                texts, "cluster_id", "incident_text", PROJECT_ID, REGION
+            )
+    themes = clustering["themes"]
+
+    st.success(f"✅ Clustering complete — **{selected_k} clusters** identified")
+    model_info = clustering["info"]
+    if model_info:
+        if model_info["action"] == "fit":
+            st.caption(f"Model v{model_info['version']}: refit ({model_info['reason']}).")
+        elif model_info["action"] == "assign":
+            st.caption(f"Model v{model_info['version']}: {model_info['new']} new incident(s) "
+                       f"assigned to existing clusters, {model_info['removed']} removed.")
+        else:
+            st.caption(f"Model v{model_info['version']}: no changes since the last run.")
+
+    missing_clusters = clustering["unmatched_actions"]
     if missing_clusters > 0:
         st.warning(f"{missing_clusters} action rows did not match a case_id in base_reports.")
 
     # ─── Tabs ───
-    tab_analysis, tab_matrix = st.tabs([
+    tab_analysis, tab_matrix, tab_k = st.tabs([
         "🔍 Detailed Analysis",
-        "📊 Strategic Risk Matrix"
+        "📊 Strategic Risk Matrix",
+        "📈 Choosing k"
     ])
 
     # ── Cluster Analysis (Drill Down) ──
@@ -338,7 +285,7 @@ if "clustering_done" in st.session_state:
 
         # 1. Cluster Selector
         # Create a list of cluster labels
-        cluster_options = sorted(base_processed["cluster_id"].unique())
+        cluster_options = clustering["clusters"]
         
         def format_cluster_option(cid):
             theme_data = themes.get(cid, {})
@@ -378,14 +325,9 @@ if "clustering_done" in st.session_state:
         with col2:
             st.markdown("<p style='text-align: center; font-weight: bold;'>Top Action Owners</p>", unsafe_allow_html=True)
             
-            top_owners_df = top_action_owners(
-                actions_merged.dropna(subset=["cluster_id"]),
-                cluster_col="cluster_id", top_n=5
-            )
-            
-            sub = top_owners_df[top_owners_df["cluster_id"] == selected_cluster].sort_values("n_actions", ascending=True)
-            
-            if not sub.empty:
+            sub = clustering["owners"].get(selected_cluster)
+
+            if sub is not None:
                 fig_bar, ax = plt.subplots(figsize=(6, 4))
                 ax.barh(sub["owner"], sub["n_actions"], color="#3182ce")
                 ax.set_xlabel("# Actions")
@@ -396,11 +338,8 @@ if "clustering_done" in st.session_state:
 
         # -- Sample Cases Expander --
         with st.expander(f"View sample cases in Cluster {selected_cluster+1}"):
-            mask = base_processed["cluster_id"] == selected_cluster
-            display_cols = ["case_id", "title", "risk_level", "severity"]
-            available = [c for c in display_cols if c in base_processed.columns]
             st.dataframe(
-                base_processed.loc[mask, available].head(20),
+                clustering["samples"][selected_cluster],
                 use_container_width=True, hide_index=True
             )
 
@@ -409,11 +348,7 @@ if "clustering_done" in st.session_state:
         st.subheader("Strategic Risk Matrix")
         st.caption("Bubble chart: X = High Risk %, Y = Reactivity Score, Size = # cases, Color = High Severity %")
 
-        matrix = compute_cluster_matrix(
-            base_processed,
-            actions_merged.dropna(subset=["cluster_id"]),
-            cluster_col="cluster_id"
-        )
+        matrix = clustering["matrix"]
         # st.dataframe(matrix, use_container_width=True, hide_index=True)
 
         # Reduced figsize
@@ -447,3 +382,25 @@ if "clustering_done" in st.session_state:
         cbar.set_label("High Severity %", fontsize=8)
         cbar.ax.tick_params(labelsize=7) 
         st.pyplot(fig, clear_figure=True, use_container_width=False)
+
+    # ── Silhouette Curve ──
+    with tab_k:
+        st.subheader("Silhouette by Number of Clusters")
+        st.caption(
+            "Higher is better-separated. The suggested k is the best score, "
+            f"or k = {DEFAULT_K} when it is within {DEFAULT_TIE_EPS} of the best. "
+            f"Scores use a sample of up to {cluster_model.SILHOUETTE_SAMPLE:,} incidents."
+        )
+        scored = {k: v for k, v in silhouettes.items() if v is not None}
+        if scored:
+            fig_k, ax = plt.subplots(figsize=(4, 2.5))
+            ax.plot(list(scored), list(scored.values()), marker="o", color="#3182ce")
+            if selected_k in scored:
+                ax.scatter([selected_k], [scored[selected_k]], s=80, color="#003a70", zorder=3)
+            ax.xaxis.set_major_locator(mticker.MaxNLocator(integer=True))
+            ax.set_xlabel("k", fontsize=8)
+            ax.set_ylabel("Silhouette", fontsize=8)
+            ax.tick_params(axis='both', which='major', labelsize=8)
+            st.pyplot(fig_k, clear_figure=True, use_container_width=False)
+        else:
+            st.info("Not enough incidents to score the clusterings.")
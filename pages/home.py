@@ -1,9 +1,13 @@
 import streamlit as st
 import streamlit.components.v1 as components
-import pandas as pd
 import plotly.graph_objects as go
+import sys
 from pathlib import Path
 
+# Add parent directory to path for incident_cube import
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import incident_cube
+
 # ─── Page Styling ───
 st.markdown("""
 <style>
@@ -179,13 +183,8 @@ with col5:
 
 st.markdown("<div style='height: 24px'></div>", unsafe_allow_html=True)
 
-# ─── Load data once ───
-DATA_DIR = Path(__file__).parent.parent
-REPORTS_XLSX = DATA_DIR / "base_reports.xlsx"
-
-df = None
-if REPORTS_XLSX.exists():
-    df = pd.read_excel(REPORTS_XLSX)
+# ─── Incident count cube (charts slice it instead of regrouping the reports) ───
+dimensions = incident_cube.dimensions()
 
 # ─── Style multiselect pills ───
 st.markdown("""
@@ -199,8 +198,8 @@ st.markdown("""
 # ─── Incident Trends Over Time (Line Chart) ───
 st.markdown('<p class="home-label" style="margin-bottom: 12px;">Safety Incident Trends Over Time with Severity Distribution</p>', unsafe_allow_html=True)
 
-if df is not None and "date" in df.columns and "severity" in df.columns and "location" in df.columns:
-    all_locations = sorted(df["location"].unique().tolist())
+if {"date", "severity", "location"} <= set(dimensions):
+    all_locations = incident_cube.values("location")
     selected_locations = st.multiselect(
         "Filter by Location",
         options=all_locations,
@@ -208,7 +207,7 @@ if df is not None and "date" in df.columns and "severity" in df.columns and "loc
         key="trend_location_filter",
     )
 
-    df_filtered = df[df["location"].isin(selected_locations)] if selected_locations else df
+    location_filter = {"location": selected_locations} if selected_locations else None
 
     severity_order = ["Minor", "Near Miss", "Potentially Significant", "Serious", "Major"]
     severity_colors = {
@@ -219,7 +218,7 @@ if df is not None and "date" in df.columns and "severity" in df.columns and "loc
         "Major": "#f28e2b",
     }
 
-    trend = df_filtered.groupby(["date", "severity"]).size().reset_index(name="count")
+    trend = incident_cube.counts(["date", "severity"], location_filter).reset_index()
     trend = trend.rename(columns={"date": "Year"})
 
     fig2 = go.Figure()
@@ -268,12 +267,11 @@ st.markdown("<div style='height: 24px'></div>", unsafe_allow_html=True)
 # ─── Severity Heatmap by Location ───
 st.markdown('<p class="home-label" style="margin-bottom: 12px;">Severity Heatmap by Location</p>', unsafe_allow_html=True)
 
-if df is not None and "severity" in df.columns and "location" in df.columns:
+if {"severity", "location"} <= set(dimensions):
     severity_order_hm = ["Minor", "Near Miss", "Potentially Significant", "Serious", "Major"]
-    existing_severities = [s for s in severity_order_hm if s in df["severity"].unique()]
+    existing_severities = [s for s in severity_order_hm if s in incident_cube.values("severity")]
 
-    pivot = df.groupby(["location", "severity"]).size().reset_index(name="count")
-    pivot_table = pivot.pivot(index="location", columns="severity", values="count").fillna(0).astype(int)
+    pivot_table = incident_cube.counts(["location", "severity"]).unstack(fill_value=0)
     pivot_table = pivot_table.reindex(columns=existing_severities, fill_value=0)
 
     fig = go.Figure(data=go.Heatmap(
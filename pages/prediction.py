@@ -1,43 +1,20 @@
 import streamlit as st
-import vertexai
-from vertexai.preview.language_models import TextEmbeddingModel
-from google.cloud import bigquery
-from google.oauth2 import service_account
-import os
+import sys
 from pathlib import Path
 
+# Add parent directory to path for clients import
+sys.path.insert(0, str(Path(__file__).parent.parent))
+# GCP clients are pooled per process (see clients.py) — built on the first
+# Analyze click, then reused instead of being re-created per prediction.
+from clients import KEY_FILE, get_bigquery_client, get_predictor_clients
+from embedding_cache import embed
+
 # ─── Configuration ───
 LOCATION = "us-central1"
 MODEL_NAME = "safety_data.severity_scorer_v2"
 EMBEDDINGS_TABLE = "safety_data.report_embeddings_v2"
 PROJECT_ID = "pure-loop-487819-j9" # Updated Project ID
 
-# ─── Authentication ───
-# Adapted from safety_bot.py to support both local secrets and Cloud Run default credentials
-def get_credentials():
-    local_creds = Path(__file__).parent.parent / "credentials.json"
-    try:
-        # Try loading from local secrets (development)
-        creds = service_account.Credentials.from_service_account_info(
-            st.secrets["gcp_service_account"],
-            scopes=["https://www.googleapis.com/auth/cloud-platform"]
-        )
-        return creds, st.secrets["gcp_service_account"].get("project_id", PROJECT_ID)
-    except (KeyError, FileNotFoundError, Exception):
-        if local_creds.exists():
-            creds = service_account.Credentials.from_service_account_file(
-                str(local_creds),
-                scopes=["https://www.googleapis.com/auth/cloud-platform"]
-            )
-            return creds, PROJECT_ID
-        
-        # Fallback to Application Default Credentials (production/Cloud Run)
-        import google.auth
-        creds, project_id = google.auth.default(
-            scopes=["https://www.googleapis.com/auth/cloud-platform"]
-        )
-        return creds, project_id
-
 # ─── Prediction Function ───
 def get_severity_score(description, injury_category):
     """
@@ -45,22 +22,14 @@ def get_severity_score(description, injury_category):
     Returns (score, label, probs_dict) or None on error.
     """
     try:
-        creds, pid = get_credentials()
-        
-        # Initialize clients with the resolved credentials
-        vertexai.init(project=pid, location=LOCATION, credentials=creds)
-        embedding_model = TextEmbeddingModel.from_pretrained("text-embedding-004")
-        # Explicitly set location for BigQuery client
-        bq_client = bigquery.Client(credentials=creds, project=pid, location=LOCATION)
-        
+        bq_client, _, pid = get_predictor_clients()
     except Exception as e:
         st.error(f"Connection Error: {e}")
         return None
 
     # Generate embedding
     try:
-        embeddings = embedding_model.get_embeddings([description])
-        vector = embeddings[0].values
+        vector = embed([description], project=pid, key_file=KEY_FILE)[0].tolist()
         vector_str = "[" + ", ".join(map(str, vector)) + "]"
     except Exception as e:
         st.error(f"Embedding Error: {e}")
@@ -107,9 +76,8 @@ def retrain_model():
     Returns: dict with metrics or None on error
     """
     try:
-        creds, _ = get_credentials()
-        # Initialize BigQuery client with hardcoded PROJECT_ID for data
-        bq_client = bigquery.Client(credentials=creds, project=PROJECT_ID, location=LOCATION)
+        # Shared BigQuery client for the hardcoded data PROJECT_ID
+        bq_client = get_bigquery_client(PROJECT_ID, LOCATION, KEY_FILE)
         
         # Count rows
         count_sql = f"SELECT COUNT(*) as n FROM `{PROJECT_ID}.{EMBEDDINGS_TABLE}`"
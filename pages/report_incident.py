@@ -1,7 +1,12 @@
 import streamlit as st
-import pandas as pd
+import sys
 from pathlib import Path
 
+# Add parent directory to path for incident_store import
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from incident_index import sync_in_background
+from incident_store import load_reports, peek_next_case_id, submit_incident
+
 # ─── Minimal Styling ───
 st.markdown("""
 <style>
@@ -60,9 +65,6 @@ st.markdown("""
 # INCIDENT REPORT FORM
 # ════════════════════════════════════════════════
 
-REPORTS_PATH = Path(__file__).parent.parent / "base_reports.xlsx"
-ACTIONS_PATH = Path(__file__).parent.parent / "actions.xlsx"
-
 # ── Dynamic action count ──
 if "action_count" not in st.session_state:
     st.session_state.action_count = 3
@@ -74,12 +76,10 @@ with st.form("incident_form", clear_on_submit=True):
 
     col1, col2 = st.columns([1, 3])
     with col1:
-        if REPORTS_PATH.exists():
-            existing_df = pd.read_excel(REPORTS_PATH)
-            next_num = len(existing_df) + 1
-        else:
-            next_num = 1
-        case_id = st.text_input("Case ID", value=f"CASE-{next_num:03d}", disabled=True)
+        st.text_input(
+            "Case ID", value=peek_next_case_id(), disabled=True,
+            help="The final ID is assigned when the report is submitted."
+        )
     with col2:
         title = st.text_input("Incident Title", placeholder="e.g. Unexpected Pressure Release During Sampling Line Replacement")
 
@@ -186,7 +186,6 @@ with st.form("incident_form", clear_on_submit=True):
             st.error("Please provide at least an Incident Title and What Happened description.")
         else:
             new_report = {
-                "case_id": f"CASE-{next_num:03d}",
                 "title": title,
                 "category": category,
                 "risk_level": risk_level,
@@ -204,40 +203,22 @@ with st.form("incident_form", clear_on_submit=True):
                 "lessons_to_prevent": lessons_to_prevent
             }
 
-            report_df = pd.DataFrame([new_report])
-            if REPORTS_PATH.exists():
-                existing = pd.read_excel(REPORTS_PATH)
-                updated = pd.concat([existing, report_df], ignore_index=True)
-            else:
-                updated = report_df
-            updated.to_excel(REPORTS_PATH, index=False)
-
-            if actions:
-                action_rows = []
-                for a in actions:
-                    a["case_id"] = f"CASE-{next_num:03d}"
-                    action_rows.append(a)
-                action_df = pd.DataFrame(action_rows)
-                if ACTIONS_PATH.exists():
-                    existing_actions = pd.read_excel(ACTIONS_PATH)
-                    updated_actions = pd.concat([existing_actions, action_df], ignore_index=True)
-                else:
-                    updated_actions = action_df
-                updated_actions.to_excel(ACTIONS_PATH, index=False)
+            case_id = submit_incident(new_report, actions)
+            sync_in_background()  # make it searchable in SafeBot within seconds
 
             st.markdown(f"""
             <div class="success-box">
-                ✅ <strong>Incident CASE-{next_num:03d} submitted successfully!</strong><br>
+                ✅ <strong>Incident {case_id} submitted successfully!</strong><br>
                 Report and {len(actions)} action(s) saved.
             </div>
             """, unsafe_allow_html=True)
             st.balloons()
 
 # ─── Recent Reports ───
-if REPORTS_PATH.exists():
+df = load_reports()
+if df is not None:
     st.markdown("---")
     st.markdown("#### Recent Incident Reports")
-    df = pd.read_excel(REPORTS_PATH)
     display_cols = ["case_id", "title", "category", "risk_level", "location", "severity", "date"]
     available_cols = [c for c in display_cols if c in df.columns]
     st.dataframe(df[available_cols].tail(10).iloc[::-1], use_container_width=True, hide_index=True)
@@ -4,7 +4,11 @@ from pathlib import Path
 
 # Add parent directory to path for safety_bot import
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from safety_bot import ask_safety_assistant
+import answer_cache
+import embedding_cache
+from incident_index import METADATA_FIELDS, incident_years
+from incident_store import load_reports
+from safety_bot import stream_safety_assistant
 
 # ─── Minimal Styling ───
 st.markdown("""
@@ -65,9 +69,100 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+def format_stats(stats):
+    """One-line summary of what a request sent to Gemini and how long it took."""
+    if stats.get("cache_hit"):
+        return f"Answered from cache · saved ~{stats['latency_saved']:.1f}s"
+    if stats.get("context_reused"):
+        line = (
+            f"Reused conversation context ({stats['new_evidence']} new incidents) "
+            f"· ~{stats['prompt_tokens']:,} prompt tokens"
+        )
+    else:
+        line = (
+            f"{stats['documents_sent']} of {stats['corpus_size']} incidents sent "
+            f"· ~{stats['prompt_tokens']:,} prompt tokens"
+        )
+    if "time_to_first_token" in stats:
+        line += f" · first token {stats['time_to_first_token']:.1f}s"
+    if "total_latency" in stats:
+        line += f" · total {stats['total_latency']:.1f}s"
+    if stats.get("filters"):
+        line += f" · filtered to {stats['filters']}"
+    if stats.get("history_tokens_full", 0) > stats.get("history_tokens", 0):
+        line += f" · history ~{stats['history_tokens']:,} of {stats['history_tokens_full']:,} tokens"
+    return line
+
+
+def format_cache_stats():
+    """
+    Lines on how often questions were answered from the semantic answer
+    cache (this process) and texts embedded from the embedding cache (all-time).
+    """
+    lines = []
+    cache = answer_cache.stats()
+    asked = cache["hits"] + cache["misses"]
+    if asked:
+        lines.append(
+            f"Answer cache: {cache['hits']} of {asked} questions ({cache['hit_rate']:.0%}) "
+            f"· ~{cache['latency_saved']:.1f}s saved"
+        )
+    embeddings = embedding_cache.stats()
+    embedded = embeddings["hits"] + embeddings["misses"]
+    if embedded:
+        lines.append(
+            f"Embedding cache: {embeddings['hits']:,} of {embedded:,} texts ({embeddings['hit_rate']:.0%}) "
+            f"· {embeddings['entries']:,} vectors stored"
+        )
+    return lines
+
+
+def filter_controls():
+    """Metadata filter widgets; returns the filters the user narrowed down."""
+    reports = load_reports()
+    if reports is None or reports.empty:
+        return {}
+    filters = {}
+    with st.expander("Filter incidents"):
+        cols = st.columns(len(METADATA_FIELDS))
+        for col, field in zip(cols, METADATA_FIELDS):
+            if field not in reports.columns:
+                continue
+            options = sorted(reports[field].dropna().astype(str).unique())
+            with col:
+                filters[field] = st.multiselect(field.replace("_", " ").title(), options, key=f"filter_{field}")
+        years = incident_years(reports).dropna()
+        if not years.empty and years.min() < years.max():
+            lo, hi = int(years.min()), int(years.max())
+            year_from, year_to = st.slider("Year", lo, hi, (lo, hi), key="filter_year")
+            if year_from > lo:
+                filters["year_from"] = year_from
+            if year_to < hi:
+                filters["year_to"] = year_to
+    return {field: value for field, value in filters.items() if value}
+
+
+def clear_on_first_chunk(chunks, placeholder):
+    """Pass chunks through, removing the placeholder once text starts arriving."""
+    for chunk in chunks:
+        placeholder.empty()
+        yield chunk
+
+
 # ─── Chat State ───
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "conversation" not in st.session_state:
+    st.session_state.conversation = {}  # retrieved context reused by follow-ups
+
+if st.session_state.messages and st.button("New conversation", key="new_conversation"):
+    # Drops the history, the cached context and any filters the questions named
+    st.session_state.messages = []
+    st.session_state.conversation = {}
+    st.rerun()
+
+# ─── Filters ───
+filters = filter_controls()
 
 # ─── Chat Container ───
 chat_container = st.container(height=480)
@@ -101,6 +196,11 @@ with chat_container:
     for msg in st.session_state.messages:
         with st.chat_message(msg["role"]):
             st.markdown(msg["content"])
+            if "stats" in msg:
+                st.caption(format_stats(msg["stats"]))
+
+for cache_line in format_cache_stats():
+    st.caption(cache_line)
 
 # ─── Chat Input ───
 placeholder = "Ask a follow-up question..." if st.session_state.messages else "Ask a safety question..."
@@ -116,12 +216,20 @@ if "pending_query" in st.session_state:
         with st.chat_message("user"):
             st.markdown(query)
         history = st.session_state.messages[:-1]
+        stats = {}
         with st.chat_message("assistant"):
-            with st.spinner("Analyzing incidents..."):
-                answer = ask_safety_assistant(query, chat_history=history)
-            st.markdown(answer)
-
-    st.session_state.messages.append({"role": "assistant", "content": answer})
+            # Render the answer as it streams in instead of behind a spinner
+            status = st.empty()
+            status.caption("Analyzing incidents...")
+            answer = st.write_stream(clear_on_first_chunk(
+                stream_safety_assistant(
+                    query, chat_history=history, stats=stats, filters=filters,
+                    conversation=st.session_state.conversation,
+                ),
+                status,
+            ))
+
+    st.session_state.messages.append({"role": "assistant", "content": answer, "stats": stats})
     st.rerun()
 
 
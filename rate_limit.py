@@ -0,0 +1,87 @@
+"""
+Client-side rate limiting and retry for Vertex AI calls.
+
+Running embedding (or Gemini) calls concurrently is only safe if the process
+as a whole stays under the project's quota. Each named limit is a token
+bucket: up to `burst` calls may start at once, then calls are admitted at
+`rate` per second. with_retry() adds exponential backoff with full jitter on
+quota / transient errors, so a burst of 429s from several threads doesn't
+retry in lock-step.
+
+Limits are per process and shared by every thread that uses the same name.
+"""
+
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# ─── Configuration ───
+# name -> (calls per second, burst)
+LIMITS = {
+    "embedding": (10.0, 10),
+    "gemini": (5.0, 5),
+}
+MAX_RETRIES = 5
+BASE_DELAY = 1.0  # seconds, doubled per attempt
+MAX_DELAY = 30.0
+
+# Substrings that mark an error as worth retrying (quota, overload, timeouts)
+RETRYABLE = (
+    "429", "resource exhausted", "resource_exhausted", "quota", "rate limit",
+    "503", "unavailable", "deadline exceeded", "timed out",
+)
+
+_lock = threading.Lock()
+_buckets = {}  # name -> {"tokens": float, "updated": monotonic seconds}
+
+
+def acquire(name: str) -> float:
+    """
+    Block until the named bucket admits one call.
+    Returns the seconds spent waiting.
+    """
+    rate, burst = LIMITS[name]
+    waited = 0.0
+    while True:
+        with _lock:
+            now = time.monotonic()
+            bucket = _buckets.setdefault(name, {"tokens": float(burst), "updated": now})
+            bucket["tokens"] = min(burst, bucket["tokens"] + (now - bucket["updated"]) * rate)
+            bucket["updated"] = now
+            if bucket["tokens"] >= 1:
+                bucket["tokens"] -= 1
+                return waited
+            delay = (1 - bucket["tokens"]) / rate
+        time.sleep(delay)
+        waited += delay
+
+
+def is_retryable(error: Exception) -> bool:
+    code = getattr(error, "code", None)
+    if code in (429, 503, 504):
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in RETRYABLE)
+
+
+def with_retry(fn, *args, limit=None, retries=MAX_RETRIES, **kwargs):
+    """
+    Call fn(*args, **kwargs), admitted by the named rate limit (if any) and
+    retried with jittered exponential backoff on quota / transient errors.
+    Any other error, or the last retryable one, is raised.
+    """
+    for attempt in range(retries + 1):
+        if limit is not None:
+            acquire(limit)
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            delay = random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+            logger.warning("%s failed (%s); retry %d in %.1fs", getattr(fn, "__name__", fn), e,
+                           attempt + 1, delay)
+            time.sleep(delay)
@@ -1,51 +1,15 @@
 # Imports
-import vertexai
-import chromadb
-import streamlit as st
-from google import genai
-from google.oauth2 import service_account
-from vertexai.preview.language_models import TextEmbeddingModel
-
-# Load GCP credentials
-# On Cloud Run: uses Application Default Credentials (automatic)
-# Locally with st.secrets: uses service account key from secrets.toml
-# Locally without secrets: uses gcloud auth application-default credentials
-try:
-    credentials = service_account.Credentials.from_service_account_info(
-        st.secrets["gcp_service_account"],
-        scopes=["https://www.googleapis.com/auth/cloud-platform"]
-    )
-except (KeyError, FileNotFoundError, Exception):
-    import google.auth
-    credentials, _ = google.auth.default(
-        scopes=["https://www.googleapis.com/auth/cloud-platform"]
-    )
-
-# Initialization
-vertexai.init(
-    project="methanex-safety",
-    location="us-central1",
-    credentials=credentials
-)
-
-embedding_model = TextEmbeddingModel.from_pretrained(
-    "text-embedding-004"
-)
+# SDK clients are built lazily on first question (see clients.py), so
+# importing this module is cheap on a cold container.
+import time
 
-client = genai.Client(
-    vertexai=True,
-    project="methanex-safety",
-    location="us-central1",
-    credentials=credentials
-)
-
-chroma_client = chromadb.PersistentClient(
-    path="./chroma_db"
-)
-
-collection = chroma_client.get_or_create_collection(
-    name="safety_incidents"
-)
+import answer_cache
+import bm25_index
+import chat_memory
+import incident_index
+from chat_memory import estimate_tokens
+from clients import get_collection, get_genai_client
+from embedding_cache import embed
 
 # System prompt for the safety assistant
 SYSTEM_PROMPT = """You are a safety knowledge assistant for Methanex industrial operations.
@@ -76,35 +40,117 @@ Do NOT add this line for greetings, general conversation, or off-topic questions
 Keep your response clear, actionable, and grounded in the data provided."""
 
 
-def ask_safety_assistant(query, chat_history=None):
-    """
-    Send a query to the safety assistant with optional conversation history.
+GEMINI_MODEL = "gemini-2.0-flash"
 
-    Args:
-        query: The user's current question.
-        chat_history: List of dicts with 'role' ('user'/'assistant') and 'content'.
-    """
-    if chat_history is None:
-        chat_history = []
+# ─── Retrieval settings ───
+TOP_K = 30  # candidates fetched from Chroma per question
+MIN_SIMILARITY = 0.3  # cosine similarity below which a candidate is dropped
+CONTEXT_TOKEN_BUDGET = 12_000  # incident text sent to Gemini per request
+KEYWORD_TOP_K = 30  # candidates fetched from the BM25 index per question
+FOLLOW_UP_TOP_K = 5  # new keyword hits considered per follow-up turn
+FOLLOW_UP_RESERVE = 2_000  # context tokens kept free for follow-up evidence
+RRF_K = 60  # reciprocal-rank fusion constant
+
+
+def _similarity(distance: float, space: str) -> float:
+    # Chroma returns distances; the embeddings are unit-length, so all three
+    # spaces map back onto cosine similarity
+    if space == "l2":  # squared euclidean
+        return 1.0 - distance / 2.0
+    return 1.0 - distance  # "cosine" and "ip"
 
-    # Retrieve ALL incidents from the collection so the model sees the full dataset
-    total_docs = collection.count()
-    query_embedding = embedding_model.get_embeddings(
-        [query]
-    )[0].values
 
+def _distance_space(collection) -> str:
+    hnsw = (getattr(collection, "configuration", None) or {}).get("hnsw") or {}
+    return hnsw.get("space") or (collection.metadata or {}).get("hnsw:space", "l2")
+
+
+def _vector_search(query_embedding, top_k, min_similarity, where=None):
+    collection = get_collection()
+    n_results = min(top_k, collection.count())
+    if n_results == 0:
+        return []
+    if where is not None:
+        incident_index.ensure_metadata(collection)
     results = collection.query(
         query_embeddings=[query_embedding],
-        n_results=total_docs
+        n_results=n_results,
+        where=where,
+        include=["documents", "distances"],
     )
+    space = _distance_space(collection)
+    hits = []
+    for doc_id, doc, distance in zip(results["ids"][0], results["documents"][0], results["distances"][0]):
+        similarity = _similarity(distance, space)
+        if similarity >= min_similarity:
+            hits.append({"id": doc_id, "document": doc, "similarity": similarity})
+    return hits
+
+
+def retrieve(query, query_embedding, top_k=TOP_K, min_similarity=MIN_SIMILARITY,
+             keyword_top_k=KEYWORD_TOP_K, filters=None):
+    """
+    Incidents relevant to the query, best first.
+
+    Chroma vector hits (above min_similarity) and BM25 keyword hits are merged
+    with reciprocal-rank fusion, so exact terms like "LOTO" or "H2S" surface
+    even when their embeddings rank them low. filters (see incident_index)
+    restrict both searches before anything is scored.
+
+    Returns:
+        List of dicts with 'id', 'document', 'score' (fused), 'similarity'
+        (None for keyword-only hits) and 'bm25' (None for vector-only hits).
+    """
+    filters = filters or {}
+    vector_hits = _vector_search(query_embedding, top_k, min_similarity,
+                                 incident_index.build_where(filters))
+    keyword_hits = bm25_index.search(query, keyword_top_k,
+                                     allowed=incident_index.matching_case_ids(filters))
+
+    fused = {}
+    for rank, hit in enumerate(vector_hits):
+        fused[hit["id"]] = {**hit, "bm25": None, "score": 1.0 / (RRF_K + rank + 1)}
+    for rank, (case_id, bm25) in enumerate(keyword_hits):
+        hit = fused.setdefault(case_id, {"id": case_id, "document": None, "similarity": None, "score": 0.0})
+        hit["bm25"] = bm25
+        hit["score"] += 1.0 / (RRF_K + rank + 1)
 
-    # Format context as numbered incidents for clear referencing
-    context_parts = []
-    for i, doc in enumerate(results["documents"][0]):
-        context_parts.append(f"--- Incident {i+1} ---\n{doc}")
-    context = "\n\n".join(context_parts)
+    # Keyword-only hits still need their document text
+    missing = [case_id for case_id, hit in fused.items() if hit["document"] is None]
+    if missing:
+        found = get_collection().get(ids=missing, include=["documents"])
+        for doc_id, doc in zip(found["ids"], found["documents"]):
+            fused[doc_id]["document"] = doc
+    hits = [hit for hit in fused.values() if hit["document"] is not None]
+    return sorted(hits, key=lambda hit: hit["score"], reverse=True)
 
-    # Build multi-turn contents for Gemini
+
+def pack_context(hits, token_budget=CONTEXT_TOKEN_BUDGET, first_number=1):
+    """
+    Format the highest-ranked hits as numbered incidents until token_budget is
+    used up. A hit too large for the remaining budget is skipped, so smaller
+    lower-ranked incidents can still fill the space.
+
+    Returns:
+        (context, packed_hits, tokens_used)
+    """
+    parts, packed, used = [], [], 0
+    for hit in hits:
+        block = f"--- Incident {first_number + len(parts)} ---\n{hit['document']}"
+        tokens = estimate_tokens(block)
+        if used + tokens > token_budget:
+            continue
+        parts.append(block)
+        packed.append(hit)
+        used += tokens
+    return "\n\n".join(parts), packed, used
+
+
+def build_contents(query, context, chat_history, summary=""):
+    """
+    Multi-turn Gemini contents: system prompt + incidents (+ summary of earlier
+    turns), the recent history verbatim, then the question.
+    """
     contents = []
 
     # First message includes system prompt + incident context
@@ -113,6 +159,8 @@ def ask_safety_assistant(query, chat_history=None):
 === INCIDENT RECORDS ===
 {context}
 """
+    if summary:
+        system_and_context += f"\n=== EARLIER CONVERSATION (SUMMARY) ===\n{summary}\n"
     # Add conversation history so the model has context for follow-ups
     if chat_history:
         # Start with a system-level user message containing the prompt + incidents
@@ -138,10 +186,269 @@ def ask_safety_assistant(query, chat_history=None):
             "role": "user",
             "parts": [{"text": system_and_context + "\n=== USER QUESTION ===\n" + query + "\n\nPlease analyze the incidents above and answer the user's question following the response format."}]
         })
+    return contents
+
+
+def collection_fingerprint() -> str:
+    """Changes whenever incidents are added to or updated in the collection."""
+    collection = get_collection()
+    version = (collection.metadata or {}).get("version", 0)
+    return f"{collection.id}:{collection.count()}:{version}"
+
+
+def _build_with_history(query, context, chat_history, conversation, stats):
+    """build_contents() with older turns folded into the conversation's rolling summary."""
+    memory = conversation if conversation is not None else {}
+    summary, recent = chat_memory.compact_history(chat_history, memory)
+    if stats is not None:
+        stats.update({
+            "history_messages": len(chat_history),
+            "history_verbatim": len(recent),
+            "history_tokens": chat_memory.history_tokens(recent)
+            + (estimate_tokens(summary) if summary else 0),
+            "history_tokens_full": chat_memory.history_tokens(chat_history),
+        })
+    return build_contents(query, context, recent, summary)
+
+
+def _conversation_key(filters):
+    return f"{collection_fingerprint()}|{sorted(filters.items())}"
+
+
+def _prepare(query, query_embedding, chat_history, stats, filters, conversation=None):
+    """
+    Retrieve context for the query and build the Gemini contents. If a
+    conversation dict is given, the retrieval result is kept in it for
+    follow-up turns (see _prepare_follow_up).
+    """
+    if chat_history is None:
+        chat_history = []
+
+    # Pick up incidents reported from other sessions or instances
+    incident_index.sync_in_background()
+
+    # Only the top-k most relevant incidents that fit the token budget are sent;
+    # the reserve leaves room for evidence follow-up questions bring in
+    hits = retrieve(query, query_embedding, filters=filters)
+    budget = CONTEXT_TOKEN_BUDGET - (FOLLOW_UP_RESERVE if conversation is not None else 0)
+    context, packed, context_tokens = pack_context(hits, budget)
+
+    contents = _build_with_history(query, context, chat_history, conversation, stats)
 
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",
+    if conversation is not None:
+        conversation.update({
+            "key": _conversation_key(filters),
+            "context": context,
+            "context_ids": [hit["id"] for hit in packed],
+            "context_tokens": context_tokens,
+        })
+
+    if stats is not None:
+        stats.update({
+            "corpus_size": get_collection().count(),
+            "candidates": len(hits),
+            "keyword_matches": sum(hit["bm25"] is not None for hit in hits),
+            "filters": incident_index.describe_filters(filters),
+            "documents_sent": len(packed),
+            "context_tokens": context_tokens,
+            "prompt_tokens": sum(
+                estimate_tokens(part["text"]) for c in contents for part in c["parts"]
+            ),
+        })
+    return contents
+
+
+def _prepare_follow_up(query, chat_history, stats, filters, conversation):
+    """
+    Build the Gemini contents for a follow-up from the conversation's cached
+    context, extended with any new keyword (BM25) hits for this turn.
+    No embedding call and no vector search.
+    """
+    known = set(conversation["context_ids"])
+    keyword_hits = [
+        (case_id, score)
+        for case_id, score in bm25_index.search(
+            query, FOLLOW_UP_TOP_K + len(known),
+            allowed=incident_index.matching_case_ids(filters),
+        )
+        if case_id not in known
+    ][:FOLLOW_UP_TOP_K]
+
+    added = []
+    if keyword_hits:
+        found = get_collection().get(ids=[case_id for case_id, _ in keyword_hits], include=["documents"])
+        documents = dict(zip(found["ids"], found["documents"]))
+        new_hits = [
+            {"id": case_id, "document": documents[case_id], "similarity": None, "bm25": score, "score": 0.0}
+            for case_id, score in keyword_hits if case_id in documents
+        ]
+        extra, added, extra_tokens = pack_context(
+            new_hits,
+            CONTEXT_TOKEN_BUDGET - conversation["context_tokens"],
+            first_number=len(known) + 1,
+        )
+        if added:
+            conversation["context"] = f"{conversation['context']}\n\n{extra}" if conversation["context"] else extra
+            conversation["context_ids"] += [hit["id"] for hit in added]
+            conversation["context_tokens"] += extra_tokens
+
+    contents = _build_with_history(query, conversation["context"], chat_history, conversation, stats)
+
+    if stats is not None:
+        stats.update({
+            "corpus_size": get_collection().count(),
+            "context_reused": True,
+            "new_evidence": len(added),
+            "filters": incident_index.describe_filters(filters),
+            "documents_sent": len(conversation["context_ids"]),
+            "context_tokens": conversation["context_tokens"],
+            "prompt_tokens": sum(
+                estimate_tokens(part["text"]) for c in contents for part in c["parts"]
+            ),
+        })
+    return contents
+
+
+def _resolve_filters(query, chat_history, filters, conversation):
+    """
+    Filters named in the question, overridden by any set explicitly (UI
+    controls). A follow-up that names none (e.g. "tell me more about the
+    second one") keeps those of the question before it; one that names any
+    starts from its own.
+    """
+    named = incident_index.parse_filters(query)
+    if not named and chat_history and conversation:
+        named = conversation.get("filters") or {}
+    if conversation is not None:
+        conversation["filters"] = named
+    return incident_index.merge_filters(named, filters)
+
+
+def _cached_answer(query_embedding, chat_history, stats, start, filters):
+    """
+    Look up a single-turn question in the semantic answer cache.
+    Returns (answer or None, fingerprint to store a fresh answer under or None).
+    """
+    if chat_history:
+        return None, None  # follow-ups depend on the conversation, never cached
+    # The same question under different filters is a different question
+    fingerprint = _conversation_key(filters)
+    hit = answer_cache.lookup(query_embedding, fingerprint)
+    if hit is None:
+        return None, fingerprint
+    if stats is not None:
+        stats.update(hit["stats"])
+        stats.update({
+            "cache_hit": True,
+            "latency_saved": hit["latency"],
+            "time_to_first_token": time.perf_counter() - start,
+            "total_latency": time.perf_counter() - start,
+        })
+    return hit["answer"], None
+
+
+def _begin(query, chat_history, stats, filters, conversation, start):
+    """
+    Shared first half of ask/stream: answer from the cache, or build the
+    Gemini contents (from the conversation's cached context on follow-ups).
+
+    Returns:
+        (cached answer or None, contents, query embedding or None,
+         fingerprint to cache a fresh answer under or None)
+    """
+    filters = _resolve_filters(query, chat_history, filters, conversation)
+
+    # Follow-ups reuse the conversation's retrieved context until the
+    # effective filters (or the collection) change
+    if chat_history and conversation and conversation.get("key") == _conversation_key(filters):
+        contents = _prepare_follow_up(query, chat_history, stats, filters, conversation)
+        return None, contents, None, None
+
+    query_embedding = embed([query])[0]
+    answer, fingerprint = _cached_answer(query_embedding, chat_history, stats, start, filters)
+    if answer is not None:
+        if conversation is not None:
+            conversation.pop("key", None)  # no retrieval happened, so there is nothing to reuse
+        return answer, None, None, None
+    contents = _prepare(query, query_embedding.tolist(), chat_history, stats, filters, conversation)
+    return None, contents, query_embedding, fingerprint
+
+
+def ask_safety_assistant(query, chat_history=None, stats=None, filters=None, conversation=None):
+    """
+    Send a query to the safety assistant with optional conversation history.
+
+    Args:
+        query: The user's current question.
+        chat_history: List of dicts with 'role' ('user'/'assistant') and 'content'.
+        filters: Optional metadata filters (see incident_index), merged over
+            any the question itself names ("in Trinidad since 2022"). A
+            follow-up that names no filters keeps the previous question's.
+        conversation: Optional dict kept for the life of a conversation (e.g.
+            in st.session_state). It caches the retrieved context, so
+            follow-ups skip the embedding call and vector search and only add
+            new keyword matches, and holds the rolling summary of older turns.
+        stats: Optional dict, filled with what was sent for this request:
+            corpus_size, candidates, keyword_matches, filters (as applied),
+            documents_sent, context_tokens,
+            prompt_tokens and total_latency (seconds); cache_hit and
+            latency_saved when answered from the semantic answer cache;
+            context_reused and new_evidence on follow-ups; history_messages,
+            history_verbatim, history_tokens (as sent) and history_tokens_full
+            (without compaction).
+    """
+    start = time.perf_counter()
+    request_stats = {} if stats is None else stats
+    answer, contents, query_embedding, fingerprint = _begin(
+        query, chat_history, request_stats, filters, conversation, start
+    )
+    if answer is not None:
+        return answer
+
+    response = get_genai_client().models.generate_content(
+        model=GEMINI_MODEL,
         contents=contents
     )
 
+    request_stats["total_latency"] = time.perf_counter() - start
+    if fingerprint is not None:
+        answer_cache.store(query_embedding, fingerprint, response.text,
+                           request_stats["total_latency"], request_stats)
     return response.text
+
+
+def stream_safety_assistant(query, chat_history=None, stats=None, filters=None, conversation=None):
+    """
+    Streaming variant of ask_safety_assistant: yields the answer in text chunks
+    as Gemini produces them (a cached answer arrives as a single chunk).
+
+    stats (if given) is filled like ask_safety_assistant's, plus
+    time_to_first_token once the first chunk arrives and total_latency when
+    the stream ends (both in seconds, measured from the call).
+    """
+    start = time.perf_counter()
+    request_stats = {} if stats is None else stats
+    answer, contents, query_embedding, fingerprint = _begin(
+        query, chat_history, request_stats, filters, conversation, start
+    )
+    if answer is not None:
+        yield answer
+        return
+
+    chunks = []
+    for chunk in get_genai_client().models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=contents
+    ):
+        text = chunk.text
+        if not text:
+            continue
+        if not chunks:
+            request_stats["time_to_first_token"] = time.perf_counter() - start
+        chunks.append(text)
+        yield text
+
+    request_stats["total_latency"] = time.perf_counter() - start
+    if fingerprint is not None and chunks:
+        answer_cache.store(query_embedding, fingerprint, "".join(chunks),
+                           request_stats["total_latency"], request_stats)
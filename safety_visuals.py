@@ -1,44 +1,59 @@
+import functools
+
+import numpy as np
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
-import os
+import incident_cube
+from incident_store import data_version, load_reports
+
+# --- Settings ---
+DEFAULT_PATH = ["severity", "location", "category"]
+FIGURE_CACHE_SIZE = 64  # (path, filters) figures kept per data version
+TABLE_ROWS = 1_000  # rows shown in the underlying-data table
+
 
 # --- Helper: Sankey Data Prep ---
-def make_sankey_data(df, col1, col2, col3):
-    # Aggregation 1: Col1 -> Col2
-    df_1 = df.groupby([col1, col2]).size().reset_index(name='value')
-    df_1.columns = ['source', 'target', 'value']
-    
-    # Aggregation 2: Col2 -> Col3
-    df_2 = df.groupby([col2, col3]).size().reset_index(name='value')
-    df_2.columns = ['source', 'target', 'value']
-
-    # Unique nodes
-    all_nodes = list(pd.concat([df[col1], df[col2], df[col3]]).unique())
-    node_map = {name: i for i, name in enumerate(all_nodes)}
-
-    # Links
-    links = []
-    
-    # Process Group 1
-    for _, row in df_1.iterrows():
-        links.append({
-            'source': node_map[row['source']],
-            'target': node_map[row['target']],
-            'value': row['value'],
-            'color': '#E0E0E0'  # Default link color
-        })
-        
-    # Process Group 2
-    for _, row in df_2.iterrows():
-        links.append({
-            'source': node_map[row['source']],
-            'target': node_map[row['target']],
-            'value': row['value'],
-            'color': '#E0E0E0'
-        })
-        
-    return all_nodes, links
+def make_sankey_data(df, *path, weights=None):
+    """
+    Nodes and links of a Sankey through the columns in path (any number >= 2).
+
+    Each column is factorized once; the links between two adjacent levels are
+    one bincount over their combined codes (weighted by weights, e.g. counts
+    from the incident cube, else one per row). Rows missing either value are
+    left out of that pair's links. A value gets one node per level it
+    appears in.
+
+    Returns:
+        (nodes, links): node labels, and a dict of source / target / value
+        arrays indexing into nodes.
+    """
+    weights = np.ones(len(df)) if weights is None else np.asarray(weights, dtype=float)
+    codes, sizes, offsets, nodes = [], [], [], []
+    for col in path:
+        col_codes, uniques = pd.factorize(df[col])
+        codes.append(col_codes)
+        sizes.append(len(uniques))
+        offsets.append(len(nodes))
+        nodes.extend(uniques.tolist())
+
+    sources, targets, values = [], [], []
+    for i in range(len(path) - 1):
+        n_target = sizes[i + 1]
+        valid = (codes[i] >= 0) & (codes[i + 1] >= 0)
+        pairs = codes[i][valid] * n_target + codes[i + 1][valid]
+        totals = np.bincount(pairs, weights=weights[valid], minlength=sizes[i] * n_target)
+        linked = np.flatnonzero(totals)
+        sources.append(offsets[i] + linked // n_target)
+        targets.append(offsets[i + 1] + linked % n_target)
+        values.append(totals[linked])
+
+    links = {
+        "source": np.concatenate(sources) if sources else np.empty(0, dtype=np.int64),
+        "target": np.concatenate(targets) if targets else np.empty(0, dtype=np.int64),
+        "value": np.concatenate(values) if values else np.empty(0),
+    }
+    return nodes, links
 
 # --- Visual Styling ---
 COLOR_MAP = {
@@ -48,7 +63,7 @@ COLOR_MAP = {
     'Minor': '#5BC0DE',      # Blue
     'Near Miss': '#5CB85C',  # Green
     'Potentially Significant': '#F7E752', # Yellowish
-    
+
     # Locations & Categories (Defaults)
     'Canada': '#777777',
     'Vancouver': '#777777',
@@ -59,39 +74,32 @@ COLOR_MAP = {
 def get_node_color(node_name):
     return COLOR_MAP.get(node_name, '#888888') # Default grey
 
-def render_safety_dashboard():
-    """
-    Call this function in your existing Streamlit app to render the safety dashboard visual.
-    Make sure 'cleaned_reports.csv' is in the same directory.
-    """
-    
-    # Check for data file
-    if not os.path.exists('base_reports.xlsx'):
-        st.error("❌ Error: `base_reports.xlsx` not found. Please place it in the application folder.")
-        return
 
-    # Load Data
-    df = pd.read_excel('base_reports.xlsx')
+# --- Figure (cached per path, filters and data version) ---
+def _freeze(filters):
+    return tuple(sorted((dim, tuple(values)) for dim, values in (filters or {}).items()))
 
-    st.markdown("### 🛡️ Incident Flow Analysis")
-    st.caption("Interactive Decomposition (Severity → Location → Category)")
 
-    # Generate Sankey Data
-    nodes, links = make_sankey_data(df, 'severity', 'location', 'category')
+@functools.lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def _sankey_figure(path, filters, version):
+    # Links come from the cube's counts per path combination, so building the
+    # figure costs the same at 100 or 100k incidents
+    # (missing values kept, so each pair of levels drops only its own gaps)
+    combos = incident_cube.counts(list(path), dict(filters) or None, dropna=False)
+    nodes, links = make_sankey_data(combos.index.to_frame(index=False), *path, weights=combos.to_numpy())
 
-    # Create Plotly Figure
     fig = go.Figure(data=[go.Sankey(
         node=dict(
             pad=15,
             thickness=20,
             line=dict(color="black", width=0.5),
-            label=nodes,
+            label=[str(n) for n in nodes],
             color=[get_node_color(n) for n in nodes]
         ),
         link=dict(
-            source=[l['source'] for l in links],
-            target=[l['target'] for l in links],
-            value=[l['value'] for l in links],
+            source=links["source"],
+            target=links["target"],
+            value=links["value"],
             color="#D3D3D3" # Light grey links
         )
     )])
@@ -101,14 +109,69 @@ def render_safety_dashboard():
         height=600,
         margin=dict(l=0, r=0, t=20, b=20)
     )
+    return fig
+
+
+def sankey_figure(path, filters=None):
+    """
+    Sankey of incidents flowing through the fields in path (incident_cube
+    DIMENSIONS), restricted to filters ({field: allowed values}). Figures are
+    reused until the data changes; treat them as read-only.
+    """
+    return _sankey_figure(tuple(path), _freeze(filters), data_version())
+
+
+def render_safety_dashboard():
+    """
+    Call this function in your existing Streamlit app to render the safety dashboard visual.
+    Choose the flow levels, then drill down by picking a value at any level.
+    """
+    dimensions = incident_cube.dimensions()
+    if not dimensions:
+        st.error("❌ Error: `base_reports.xlsx` not found. Please place it in the application folder.")
+        return
+
+    st.markdown("### 🛡️ Incident Flow Analysis")
+    path = st.multiselect(
+        "Flow levels",
+        options=dimensions,
+        default=[d for d in DEFAULT_PATH if d in dimensions],
+        key="sankey_path",
+    )
+    if len(path) < 2:
+        st.info("Pick at least two levels to draw the flow.")
+        return
+
+    # Drill-down: each pick narrows the flow and the choices at later levels
+    filters = {}
+    for level, column in zip(path, st.columns(len(path))):
+        with column:
+            choice = st.selectbox(
+                level.replace("_", " ").title(),
+                ["All"] + incident_cube.values(level, filters or None),
+                key=f"sankey_drill_{level}",
+            )
+        if choice != "All":
+            filters[level] = [choice]
+
+    trail = " → ".join(f"{level} = {filters[level][0]}" if level in filters else level for level in path)
+    st.caption(f"Interactive Decomposition ({trail})")
 
     # Display
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(sankey_figure(path, filters), use_container_width=True)
 
     # Optional: Data Table Expander
     with st.expander("View Underlying Data"):
+        df = load_reports()
+        mask = np.ones(len(df), dtype=bool)
+        for level, values in filters.items():
+            mask &= df[level].isin(values).to_numpy()
+        matching = int(mask.sum())
+        cols = [c for c in ['date', 'severity', 'location', 'category', 'title'] if c in df.columns]
         st.dataframe(
-            df[['date', 'severity', 'location', 'category', 'title']],
+            df.loc[mask, cols].head(TABLE_ROWS),
             use_container_width=True,
             hide_index=True
         )
+        if matching > TABLE_ROWS:
+            st.caption(f"Showing the first {TABLE_ROWS:,} of {matching:,} matching incidents.")
@@ -0,0 +1,116 @@
+"""
+Cold-start benchmark.
+
+Measures, each in a fresh interpreter (i.e. like a cold Cloud Run container):
+
+    1. Import time per module (python -X importtime, cumulative)
+    2. Time to first render of the app and of each page, and which heavy SDKs
+       the render pulled in (should be none until a feature needs them)
+
+pages/home.py reports a page_link error when rendered on its own (it expects
+app.py's navigation); the app.py row covers the real home-page start-up.
+
+USAGE:
+    python scripts/bench_startup.py            # modules + pages
+    python scripts/bench_startup.py --modules  # import times only
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+MODULES = [
+    # Framework
+    "streamlit", "pandas", "pyarrow", "plotly.graph_objects",
+    # App modules
+    "incident_store", "clients", "safety_bot", "safety_visuals", "severity_tab",
+    # Heavy SDKs that should only load on first use
+    "vertexai", "vertexai.preview.language_models", "google.genai",
+    "google.cloud.bigquery", "chromadb", "sklearn.cluster", "matplotlib.pyplot",
+]
+
+HEAVY_SDKS = [
+    "vertexai", "google.genai", "google.cloud.bigquery", "chromadb",
+    "sklearn", "matplotlib",
+]
+
+PAGES = [
+    "app.py",  # entry point: sidebar + default (home) page
+    "pages/home.py",
+    "pages/safebot.py",
+    "pages/clustering.py",
+    "pages/prediction.py",
+    "pages/report_incident.py",
+]
+
+_RENDER_SNIPPET = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({path!r}, default_timeout=120)
+start = time.perf_counter()
+at.run()
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+errors = [str(e.value)[:80] for e in at.exception]
+print(json.dumps({{"seconds": elapsed, "heavy": heavy, "errors": errors}}))
+"""
+
+
+def import_time(module: str):
+    """Cumulative import time of module in seconds, or None if it fails to import."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_DIR, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return None
+    cumulative = 0
+    for line in proc.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative = max(cumulative, int(parts[1]))
+    return cumulative / 1e6
+
+
+def first_render(page: str):
+    proc = subprocess.run(
+        [sys.executable, "-c", _RENDER_SNIPPET.format(path=page, heavy=HEAVY_SDKS)],
+        cwd=REPO_DIR, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return {"seconds": None, "heavy": [], "errors": [proc.stderr.strip().splitlines()[-1]]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark")
+    parser.add_argument("--modules", action="store_true", help="Only measure module import times")
+    args = parser.parse_args()
+
+    print(f"{'Module':<36}{'Import (cold)':>14}")
+    print("-" * 50)
+    for module in MODULES:
+        seconds = import_time(module)
+        shown = "not installed" if seconds is None else f"{seconds * 1000:,.0f} ms"
+        print(f"{module:<36}{shown:>14}")
+
+    if args.modules:
+        return
+
+    print()
+    print(f"{'Page':<28}{'First render':>14}  Heavy SDKs loaded")
+    print("-" * 70)
+    for page in PAGES:
+        result = first_render(page)
+        shown = "failed" if result["seconds"] is None else f"{result['seconds'] * 1000:,.0f} ms"
+        print(f"{page:<28}{shown:>14}  {', '.join(result['heavy']) or '-'}")
+        for error in result["errors"]:
+            print(f"{'':<44}! {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Text preparation benchmark: text_prep.embedding_text() and display_text()
+(as the vector store and the clustering page call them) against the
+row-wise apply versions they replaced (agg(" ".join, axis=1) for the
+embedding text, clean_text() per cell inside a DataFrame.apply lambda for
+the display text).
+
+Rows are synthetic reports sampled from base_reports.xlsx (narratives with
+newlines, repeated spaces and missing fields mixed in). Both versions must
+produce identical text; the script checks that before reporting timings.
+
+Narratives average ~3 KB per report, so 1M rows is ~3 GB of text before
+either version runs; allow ~16 GB of memory for the default sizes.
+
+USAGE:
+    python scripts/bench_text_prep.py                      # 100k and 1M rows
+    python scripts/bench_text_prep.py --rows 10000 100000
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from incident_store import TEXT_COLS, load_reports
+from text_prep import DOCUMENT_COLS, display_text, embedding_text
+
+
+# ─── Apply-based reference (the previous implementation) ───
+def clean_text(x) -> str:
+    if pd.isna(x):
+        return ""
+    x = str(x).replace("\n", " ").replace("\r", " ")
+    x = re.sub(r"\s+", " ", x).strip()
+    return x
+
+
+def prepare_text_apply(df: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        "embedding_text": df[DOCUMENT_COLS].fillna("").astype(str).agg(" ".join, axis=1),
+        "display_text": df[TEXT_COLS].apply(
+            lambda r: " | ".join([clean_text(v) for v in r.values if clean_text(v)]),
+            axis=1
+        ),
+    }, index=df.index)
+
+
+def prepare_text_vectorized(df: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        "embedding_text": embedding_text(df),
+        "display_text": display_text(df),
+    }, index=df.index)
+
+
+# ─── Data ───
+def synthetic_reports(n: int, seed: int = 0) -> pd.DataFrame:
+    """n reports resampled from the base data, with messy whitespace and gaps."""
+    rng = np.random.default_rng(seed)
+    base = load_reports()
+    df = base[TEXT_COLS].iloc[rng.integers(0, len(base), n)].reset_index(drop=True)
+    for col in TEXT_COLS:
+        values = df[col].astype(object)
+        messy = rng.random(n) < 0.2
+        values[messy] = values[messy].astype(str) + "  \n\t extra  "
+        values[rng.random(n) < 0.05] = None
+        df[col] = values.astype("str")  # Arrow-backed, as load_reports() returns them
+    return df
+
+
+def _timed(fn, df):
+    start = time.perf_counter()
+    result = fn(df)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Text preparation benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'Rows':>10}{'apply':>12}{'vectorized':>14}{'speed-up':>10}  identical")
+    print("-" * 58)
+    for n in args.rows:
+        df = synthetic_reports(n)
+        expected, apply_seconds = _timed(prepare_text_apply, df)
+        result, vector_seconds = _timed(prepare_text_vectorized, df)
+        identical = all(
+            expected[col].astype(str).tolist() == result[col].astype(str).tolist()
+            for col in expected.columns
+        )
+        print(f"{n:>10,}{apply_seconds:>11.2f}s{vector_seconds:>13.2f}s"
+              f"{apply_seconds / vector_seconds:>9.1f}x  {'yes' if identical else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Consistency check for the incremental Chroma indexer (incident_index.sync_index).
+
+Builds an in-memory Chroma collection from a scratch copy of the workbooks and
+checks that:
+
+    - a first sync indexes every incident in the store
+    - a first sync over a notebook-built collection (same documents, no
+      metadata) only attaches metadata, without re-upserting any incident
+    - rows bulk-loaded from another source with ingest.py survive the next
+      sync (they were never indexed from the store, so are not its to delete)
+    - a fresh incident vector store takes its vectors from the collection
+      instead of embedding every incident again
+
+Embeddings come from a deterministic offline stand-in for the Vertex AI model,
+so the check needs no credentials and makes no API calls.
+
+USAGE:
+    python scripts/check_index_sync.py
+
+Exits non-zero if any check fails.
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+
+def _offline_embeddings(texts, model, dimensionality, *args, **kwargs):
+    """A fixed pseudo-random unit vector per text."""
+    vectors = np.empty((len(texts), dimensionality), dtype=np.float32)
+    for i, text in enumerate(texts):
+        seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).normal(size=dimensionality)
+        vectors[i] = vector / np.linalg.norm(vector)
+    return vectors
+
+
+def _external_reports(n: int) -> pd.DataFrame:
+    """n reports from outside the store, as ingest.py --source would read them."""
+    return pd.DataFrame({
+        "case_id": [f"OLD-{i:03d}" for i in range(1, n + 1)],
+        "title": [f"Archived incident {i}" for i in range(1, n + 1)],
+        "location": "Canada",
+        "severity": "Minor",
+        "date": "2015",
+        "what_happened": [f"Archived report {i} loaded from an old export." for i in range(1, n + 1)],
+    })
+
+
+def main():
+    scratch = Path(tempfile.mkdtemp(prefix="safety_index_check_"))
+    for name in ("base_reports.xlsx", "actions.xlsx"):
+        if (REPO_DIR / name).exists():
+            shutil.copy(REPO_DIR / name, scratch / name)
+    # Must be set before incident_store is imported
+    os.environ["SAFETY_DATA_DIR"] = str(scratch)
+    sys.path.insert(0, str(REPO_DIR))
+    import chromadb
+    import clients
+    import embedding_cache
+    import incident_index
+    import incident_store
+    import incident_vectors
+    from ingest import ingest
+
+    embedding_cache._embed_remote = _offline_embeddings
+    collection = chromadb.EphemeralClient().get_or_create_collection("index_check")
+    clients.get_collection = lambda name=clients.COLLECTION_NAME: collection
+    reports = incident_store.load_reports()
+    n_store = 0 if reports is None else len(reports)
+
+    failures = []
+    result = incident_index.sync_index(collection)
+    print(f"First sync:          {result}")
+    if collection.count() != n_store:
+        failures.append(f"first sync indexed {collection.count()} incidents, expected {n_store}")
+
+    external = _external_reports(5)
+    ingest(external, collection=collection, progress=None)
+    result = incident_index.sync_index(collection)
+    print(f"Sync after ingest:   {result}")
+    if result["deleted"]:
+        failures.append(f"sync after an external ingest deleted {result['deleted']} incidents")
+    kept = set(collection.get(ids=external["case_id"].tolist(), include=[])["ids"])
+    if len(kept) != len(external):
+        failures.append(f"{len(external) - len(kept)} ingested rows were dropped from the collection")
+    if collection.count() != n_store + len(external):
+        failures.append(f"collection holds {collection.count()} incidents, expected {n_store + len(external)}")
+
+    # The notebook indexed the same documents with no metadata
+    notebook = chromadb.EphemeralClient().get_or_create_collection("notebook_check")
+    indexed = collection.get(ids=reports["case_id"].astype(str).tolist(), include=["documents", "embeddings"])
+    notebook.add(ids=indexed["ids"], documents=indexed["documents"], embeddings=indexed["embeddings"])
+    incident_index.reset_state()
+    result = incident_index.sync_index(notebook)
+    print(f"Notebook collection: {result}")
+    if result["upserted"]:
+        failures.append(f"first sync over a notebook collection re-upserted {result['upserted']} incidents")
+    if result["relabelled"] != n_store:
+        failures.append(f"metadata attached to {result['relabelled']} notebook incidents, expected {n_store}")
+
+    # A cold vector store must take every vector from the collection
+    for path in (incident_vectors.VECTORS_PATH, incident_vectors.INDEX_PATH):
+        path.unlink(missing_ok=True)
+    incident_vectors._loaded.update({"index": None, "matrix": None, "position": None})
+    result = incident_vectors.sync_vectors()
+    print(f"Cold vector store:   {result}")
+    if result["embedded"]:
+        failures.append(f"a cold vector store re-embedded {result['embedded']} incidents held in the collection")
+
+    shutil.rmtree(scratch, ignore_errors=True)
+    if failures:
+        print("FAILED:\n  - " + "\n  - ".join(failures))
+        sys.exit(1)
+    print("OK: the indexer kept every incident it did not index itself and reused indexed vectors.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Concurrency stress test for incident submissions.
+
+Runs many parallel "sessions" (threads across several processes) that all call
+incident_store.submit_incident() against a scratch copy of the workbooks while
+compactions run in the background, then checks that:
+
+    - every submission got a distinct, gap-free CASE-xxx ID
+    - every report and action is readable afterwards (nothing overwritten/lost)
+    - each action carries its own report's case ID
+    - the incrementally maintained manifest matches the data
+
+USAGE:
+    python scripts/stress_submissions.py --processes 4 --threads 8 --per-session 25
+
+Exits non-zero if any check fails.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+
+def _session(worker_id: int, per_session: int):
+    import incident_store
+
+    latencies, submitted = [], []
+    for i in range(per_session):
+        report = {
+            "title": f"stress {worker_id}-{i}",
+            "location": "Canada",
+            "severity": "Minor",
+            "date": "2025",
+            "what_happened": "Synthetic submission from the stress test.",
+        }
+        actions = [
+            {"action_number": n + 1, "action": f"action {n + 1}", "owner": "Tester",
+             "timing": "<30 days", "verification": "n/a"}
+            for n in range(2)
+        ]
+        start = time.perf_counter()
+        case_id = incident_store.submit_incident(report, actions)
+        latencies.append(time.perf_counter() - start)
+        submitted.append((case_id, report["title"]))
+    return latencies, submitted
+
+
+def _process(proc_id: int, threads: int, per_session: int):
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [
+            pool.submit(_session, proc_id * threads + t, per_session)
+            for t in range(threads)
+        ]
+        results = [f.result() for f in futures]
+    latencies = [x for lat, _ in results for x in lat]
+    submitted = [x for _, sub in results for x in sub]
+    return latencies, submitted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--per-session", type=int, default=25)
+    parser.add_argument("--compact-every", type=float, default=0.2,
+                        help="Seconds between background compactions (0 to disable)")
+    args = parser.parse_args()
+
+    scratch = Path(tempfile.mkdtemp(prefix="safety_stress_"))
+    for name in ("base_reports.xlsx", "actions.xlsx"):
+        if (REPO_DIR / name).exists():
+            shutil.copy(REPO_DIR / name, scratch / name)
+    # Must be set before incident_store is imported (here and in the workers)
+    os.environ["SAFETY_DATA_DIR"] = str(scratch)
+    sys.path.insert(0, str(REPO_DIR))
+    import incident_store
+
+    base_reports = incident_store.load_reports()
+    base_actions = incident_store.load_actions()
+    n_base_reports = 0 if base_reports is None else len(base_reports)
+    n_base_actions = 0 if base_actions is None else len(base_actions)
+    first_number = incident_store._last_case_number() + 1
+
+    sessions = args.processes * args.threads
+    expected = sessions * args.per_session
+    print(f"{sessions} concurrent sessions x {args.per_session} submissions = {expected}")
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.processes) as pool:
+        futures = [
+            pool.submit(_process, p, args.threads, args.per_session)
+            for p in range(args.processes)
+        ]
+        compactions = 0
+        while args.compact_every and not all(f.done() for f in futures):
+            time.sleep(args.compact_every)
+            compactions += incident_store.compact()
+        results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+    compactions += incident_store.compact()
+
+    latencies = sorted(x for lat, _ in results for x in lat)
+    submitted = [x for _, sub in results for x in sub]
+
+    failures = []
+    ids = [case_id for case_id, _ in submitted]
+    if len(set(ids)) != len(ids):
+        failures.append(f"duplicate case IDs: {len(ids) - len(set(ids))}")
+    expected_ids = {incident_store.CASE_ID_FORMAT.format(n)
+                    for n in range(first_number, first_number + expected)}
+    if set(ids) != expected_ids:
+        failures.append("case IDs are not a contiguous sequence")
+
+    incident_store._frames.clear()
+    reports = incident_store.load_reports()
+    actions = incident_store.load_actions()
+    if len(reports) != n_base_reports + expected:
+        failures.append(f"expected {n_base_reports + expected} reports, found {len(reports)}")
+    if len(actions) != n_base_actions + 2 * expected:
+        failures.append(f"expected {n_base_actions + 2 * expected} actions, found {len(actions)}")
+    titles = dict(zip(reports["case_id"], reports["title"]))
+    if any(titles.get(case_id) != title for case_id, title in submitted):
+        failures.append("a stored report does not match what was submitted")
+    new_actions = actions[actions["owner"] == "Tester"]
+    if not new_actions["case_id"].isin(ids).all():
+        failures.append("an action is attached to an unknown case ID")
+    manifest = incident_store.read_manifest()
+    if (manifest["incidents"], manifest["actions"]) != (len(reports), len(actions)):
+        failures.append("manifest counts drifted from the data")
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+    print(f"Throughput:  {expected / elapsed:,.0f} submissions/s ({elapsed:.2f}s total)")
+    print(f"Latency:     p50 {pct(0.50):.1f} ms  p95 {pct(0.95):.1f} ms  p99 {pct(0.99):.1f} ms")
+    print(f"Compactions: {compactions}")
+    shutil.rmtree(scratch, ignore_errors=True)
+
+    if failures:
+        print("FAILED:\n  - " + "\n  - ".join(failures))
+        sys.exit(1)
+    print("OK: all submissions stored exactly once with unique IDs.")
+
+
+if __name__ == "__main__":
+    main()
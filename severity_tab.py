@@ -25,18 +25,12 @@ IMPORTANT:
 """
 
 import streamlit as st
-import vertexai
-from vertexai.preview.language_models import TextEmbeddingModel
-from google.cloud import bigquery
-from google.oauth2 import service_account
 import pandas as pd
 import time
-import os
+from clients import KEY_FILE, get_predictor_clients
+from embedding_cache import embed
 
 # ─── Configuration (do NOT change these) ─────────────────────────
-CREDENTIALS_FILE = "credentials.json"
-PROJECT_ID = "pure-loop-487819-j9"  # fallback when no credentials file
-LOCATION = "us-central1"
 DATASET = "safety_data"
 MODEL_NAME = f"{DATASET}.severity_scorer_v2"
 EMBEDDINGS_TABLE = f"{DATASET}.report_embeddings_v2"
@@ -44,27 +38,16 @@ EMBEDDINGS_TABLE = f"{DATASET}.report_embeddings_v2"
 
 def _get_clients():
     """
-    Initialize GCP clients. Returns (bq_client, embedding_model, project_id).
+    GCP clients. Returns (bq_client, embedding_model, project_id).
     
-    - LOCAL: Uses credentials.json file
+    - LOCAL: Uses credentials.json if present, else the gcp_service_account
+      secret
     - CLOUD RUN: Uses Application Default Credentials (no file needed)
+    
+    The clients are pooled per process (see clients.get_predictor_clients),
+    so only the first call pays for credential lookup and SDK setup.
     """
-    if os.path.exists(CREDENTIALS_FILE):
-        # Local development — use the service account key file
-        creds = service_account.Credentials.from_service_account_file(CREDENTIALS_FILE)
-        pid = creds.project_id
-        vertexai.init(project=pid, location=LOCATION, credentials=creds)
-        emb_model = TextEmbeddingModel.from_pretrained("text-embedding-004")
-        bq = bigquery.Client(credentials=creds, project=pid)
-    else:
-        # Cloud Run / deployed — use Application Default Credentials
-        import google.auth
-        creds, pid = google.auth.default()
-        pid = pid or PROJECT_ID
-        vertexai.init(project=pid, location=LOCATION)
-        emb_model = TextEmbeddingModel.from_pretrained("text-embedding-004")
-        bq = bigquery.Client(project=pid)
-    return bq, emb_model, pid
+    return get_predictor_clients()
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -83,10 +66,10 @@ def predict_severity(description: str, injury_category: str = "No Injury"):
         or None on error
     """
     try:
-        bq, emb_model, pid = _get_clients()
+        bq, _, pid = _get_clients()
         
-        # Generate text embedding
-        vector = emb_model.get_embeddings([description])[0].values
+        # Generate text embedding (served from the shared cache when seen before)
+        vector = embed([description], project=pid, key_file=KEY_FILE)[0].tolist()
         vector_str = "[" + ", ".join(map(str, vector)) + "]"
         
         # Query BigQuery ML model
@@ -128,11 +111,13 @@ def append_report(what_happened: str, risk_level: str, injury_category: str):
     Returns:
         True on success, False on error
     """
+    from google.cloud import bigquery
+
     try:
-        bq, emb_model, pid = _get_clients()
+        bq, _, pid = _get_clients()
         
-        # Generate embedding
-        vector = emb_model.get_embeddings([what_happened])[0].values
+        # Generate embedding (served from the shared cache when seen before)
+        vector = embed([what_happened], project=pid, key_file=KEY_FILE)[0].tolist()
         
         # Append to BigQuery table
         new_row = pd.DataFrame({
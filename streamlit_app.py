@@ -1,14 +1,10 @@
 
 import streamlit as st
-import vertexai
-from vertexai.preview.language_models import TextEmbeddingModel
-from google.cloud import bigquery
-from google.oauth2 import service_account
 import os
+from clients import KEY_FILE, get_predictor_clients
+from embedding_cache import embed
 
 # ─── Configuration ───────────────────────────────────────────────
-CREDENTIALS_FILE = "credentials.json"
-LOCATION = "us-central1"
 MODEL_NAME = "safety_data.severity_scorer_v2"
 
 # Page Config
@@ -37,25 +33,21 @@ def get_severity_score(description, injury_category):
     Uses Vertex AI embeddings + BigQuery ML to predict severity.
     Returns (score, label, probs_dict) or None on error.
     """
-    if not os.path.exists(CREDENTIALS_FILE):
-        st.error(f"Credentials file '{CREDENTIALS_FILE}' not found.")
+    # Resolved next to the app, so it is found whatever directory it is run from
+    if not os.path.exists(KEY_FILE):
+        st.error(f"Credentials file '{KEY_FILE}' not found.")
         return None
 
     try:
-        creds = service_account.Credentials.from_service_account_file(CREDENTIALS_FILE)
-        pid = creds.project_id
-        
-        vertexai.init(project=pid, location=LOCATION, credentials=creds)
-        embedding_model = TextEmbeddingModel.from_pretrained("text-embedding-004")
-        bq_client = bigquery.Client(credentials=creds, project=pid)
+        # Pooled per process — built on the first prediction, then reused
+        bq_client, _, pid = get_predictor_clients()
     except Exception as e:
         st.error(f"Connection Error: {e}")
         return None
 
     # Generate embedding
     try:
-        embeddings = embedding_model.get_embeddings([description])
-        vector = embeddings[0].values
+        vector = embed([description], project=pid, key_file=KEY_FILE)[0].tolist()
         vector_str = "[" + ", ".join(map(str, vector)) + "]"
     except Exception as e:
         st.error(f"Embedding Error: {e}")
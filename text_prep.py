@@ -0,0 +1,104 @@
+"""
+Vectorized text preparation for incident narratives.
+
+Every text form the app derives from a report is built here from whole
+columns with Arrow compute kernels, instead of a Python function per row or
+per cell:
+
+    embedding_text  the narrative fields joined with spaces; what every
+                    incident is embedded and indexed in Chroma under
+                    (incident_vectors.incident_text)
+    display_text    title + narrative fields, whitespace-collapsed and
+                    joined with " | ", empty fields skipped; shown to Gemini
+                    for cluster themes
+
+scripts/bench_text_prep.py compares them with the row-wise apply versions.
+"""
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from incident_store import TEXT_COLS
+
+# ─── Configuration ───
+DOCUMENT_COLS = [
+    "what_happened", "what_could_have_happened", "why_did_it_happen",
+    "causal_factors", "what_went_well", "lessons_to_prevent",
+]
+DISPLAY_SEPARATOR = " | "
+CHUNK_ROWS = 50_000
+
+_TEXT = pa.large_string()
+_FORM_COLS = {"embedding_text": DOCUMENT_COLS, "display_text": TEXT_COLS}
+
+
+# ─── Column kernels ───
+def _column(df: pd.DataFrame, col: str) -> pa.Array:
+    """A text column as an Arrow array, missing values (or column) as ""."""
+    if col not in df.columns:
+        return pa.array([""] * len(df), _TEXT)
+    return pa.array(df[col].fillna("").astype(str), _TEXT)
+
+
+def _clean(text: pa.Array) -> pa.Array:
+    # Same as " ".join(s.split()) per cell: trimming first makes the
+    # whitespace split drop the empty pieces between runs
+    words = pc.utf8_split_whitespace(pc.utf8_trim_whitespace(text))
+    return pc.binary_join(words, pa.scalar(" ", _TEXT))
+
+
+def _join(columns, sep: str, skip_empty=False) -> pa.Array:
+    if not skip_empty:
+        return pc.binary_join_element_wise(*columns, pa.scalar(sep, _TEXT))
+    # Suffix each non-empty cell with sep, concatenate, drop the final sep.
+    # (null_handling="skip" would express this directly, but it loses rows
+    # in which every value is null.)
+    empty = pa.scalar("", _TEXT)
+    suffixed = [
+        pc.if_else(pc.equal(c, ""), empty, pc.binary_join_element_wise(c, empty, pa.scalar(sep, _TEXT)))
+        for c in columns
+    ]
+    joined = pc.binary_join_element_wise(*suffixed, empty)
+    return pc.utf8_slice_codeunits(joined, 0, -len(sep))
+
+
+def _forms(raw, forms):
+    out = {}
+    if "embedding_text" in forms:
+        out["embedding_text"] = _join([raw[c] for c in DOCUMENT_COLS], " ")
+    if "display_text" in forms:
+        cleaned = [_clean(raw[c]) for c in TEXT_COLS]
+        out["display_text"] = _join(cleaned, DISPLAY_SEPARATOR, skip_empty=True)
+    return out
+
+
+def _build(df: pd.DataFrame, forms) -> pd.DataFrame:
+    # Row batches of CHUNK_ROWS keep the kernels' temporaries (the split
+    # word lists above all) bounded however large df is
+    cols = list(dict.fromkeys(c for form in forms for c in _FORM_COLS[form]))
+    batches = {form: [] for form in forms}
+    for start in range(0, len(df), CHUNK_ROWS):
+        chunk = df.iloc[start:start + CHUNK_ROWS]
+        for form, text in _forms({c: _column(chunk, c) for c in cols}, forms).items():
+            batches[form].append(text)
+    return pd.DataFrame({
+        form: pd.Series(pa.chunked_array(texts, _TEXT), index=df.index, dtype="str")
+        for form, texts in batches.items()
+    }, index=df.index)
+
+
+# ─── Text forms ───
+def clean(text: pd.Series) -> pd.Series:
+    """Collapse whitespace runs (newlines included) to one space and strip."""
+    return pd.Series(_clean(pa.array(text.fillna("").astype(str), _TEXT)), index=text.index, dtype="str")
+
+
+def embedding_text(df: pd.DataFrame) -> pd.Series:
+    """The text each incident is embedded under."""
+    return _build(df, ["embedding_text"])["embedding_text"]
+
+
+def display_text(df: pd.DataFrame) -> pd.Series:
+    """Cleaned title + narrative, " | "-joined with empty fields skipped."""
+    return _build(df, ["display_text"])["display_text"]